@@ -0,0 +1,150 @@
+import json
+import numpy as np
+import pandas as pd
+from src.raw_columns import COLUMN_NAMES
+
+"""
+A module for generating synthetic raw fintech data which includes the following functions:
+- generate_rows : A function to generate raw rows with the columns streamed by the producer
+- write_raw_csv : A function to write a large raw dataset to a CSV file in chunks
+- write_states_map : A function to write the state code to state name map used by the pipeline
+"""
+
+STATES = {
+    "AZ": "Arizona",
+    "CA": "California",
+    "CO": "Colorado",
+    "FL": "Florida",
+    "GA": "Georgia",
+    "IL": "Illinois",
+    "MA": "Massachusetts",
+    "MI": "Michigan",
+    "NC": "North Carolina",
+    "NJ": "New Jersey",
+    "NY": "New York",
+    "OH": "Ohio",
+    "PA": "Pennsylvania",
+    "TX": "Texas",
+    "VA": "Virginia",
+    "WA": "Washington",
+}
+STATE_WEIGHTS = np.array([3, 14, 3, 7, 3, 4, 2, 3, 3, 4, 8, 3, 4, 8, 3, 3], dtype=float)
+
+EMP_LENGTHS = ["< 1 year", "1 year"] + [f"{i} years" for i in range(2, 10)] + ["10+ years"]
+EMP_TITLES = ["Teacher", "Manager", "Registered Nurse", "Driver", "Owner", "Sales", "Engineer", "Supervisor"]
+HOME_OWNERSHIP = ["MORTGAGE", "RENT", "OWN", "ANY"]
+VERIFICATION_STATUS = ["Verified", "Source Verified", "Not Verified"]
+LOAN_STATUS = ["Current", "Fully Paid", "Charged Off", "Late (31-120 days)", "In Grace Period", "Late (16-30 days)", "Default"]
+TYPES = ["Individual", "INDIVIDUAL", "Joint App", "JOINT", "DIRECT_PAY"]
+PURPOSES = ["debt_consolidation", "credit_card", "home_improvement", "other", "major_purchase",
+            "medical", "small_business", "car", "vacation", "moving", "house", "wedding",
+            "renewable_energy", "educational"]
+DESCRIPTIONS = ["Debt consolidation", "Credit card refinancing", "Home improvement", "Other", "Business"]
+
+
+def _choice(rng: np.random.Generator, values: list, n: int, p: list = None) -> np.ndarray:
+    p = None if p is None else np.asarray(p, dtype=float) / np.sum(p)
+    return np.asarray(values, dtype=object)[rng.choice(len(values), size=n, p=p)]
+
+
+def _with_nulls(rng: np.random.Generator, values: np.ndarray, null_rate: float) -> np.ndarray:
+    values = values.astype(object)
+    values[rng.random(len(values)) < null_rate] = None
+    return values
+
+
+def _with_outliers(rng: np.random.Generator, values: np.ndarray, outlier_rate: float) -> np.ndarray:
+    outliers = rng.random(len(values)) < outlier_rate
+    return np.where(outliers, values * rng.uniform(10, 50, len(values)), values)
+
+
+def generate_rows(
+    n: int,
+    null_rate: float = 0.05,
+    outlier_rate: float = 0.01,
+    seed: int = 0,
+    first_loan_id: int = 0,
+) -> pd.DataFrame:
+    """A function to generate raw rows with the columns streamed by the producer
+    Args:
+        n: The number of rows
+        null_rate: The share of nulls in the nullable columns (emp_title, emp_length, int_rate, description)
+        outlier_rate: The share of rows with an extreme income, balance or loan amount
+        seed: The seed of the random generator
+        first_loan_id: The loan_id of the first row, loan_ids are consecutive
+    Returns:
+        A pandas DataFrame
+    """
+    rng = np.random.default_rng(seed)
+
+    annual_inc = _with_outliers(rng, np.round(rng.lognormal(11.1, 0.5, n), -2), outlier_rate)
+    is_joint = rng.random(n) < 0.1
+    annual_inc_joint = np.where(is_joint, np.round(annual_inc * rng.uniform(1.2, 2.0, n), -2), np.nan)
+    tot_cur_bal = _with_outliers(rng, np.round(rng.lognormal(11.3, 1.0, n)), outlier_rate)
+    avg_cur_bal = np.round(tot_cur_bal / rng.integers(2, 15, n))
+    loan_amount = _with_outliers(rng, rng.integers(20, 800, n) * 50.0, outlier_rate)
+    funded_amount = np.where(rng.random(n) < 0.9, loan_amount, np.round(loan_amount * rng.uniform(0.5, 1.0, n), -1))
+    grade = rng.integers(1, 36, n)
+    int_rate = np.round(0.05 + grade * 0.006 + rng.normal(0, 0.01, n), 4)
+    issue_date = pd.Timestamp("2012-01-01") + pd.to_timedelta(rng.integers(0, 365 * 8, n), unit="D")
+    state = _choice(rng, list(STATES), n, STATE_WEIGHTS)
+    addr_state = np.where(rng.random(n) < 0.95, state, _choice(rng, list(STATES), n, STATE_WEIGHTS))
+
+    rows = {
+        "Customer Id": [f"YNZ{i:09d}" for i in rng.integers(0, 10**9, n)],
+        "Emp Title": _with_nulls(rng, _choice(rng, EMP_TITLES, n), null_rate),
+        "Emp Length": _with_nulls(rng, _choice(rng, EMP_LENGTHS, n), null_rate),
+        "Home Ownership": _choice(rng, HOME_OWNERSHIP, n, [48, 40, 11, 1]),
+        "Annual Inc": annual_inc,
+        "Annual Inc Joint": annual_inc_joint,
+        "Verification Status": _choice(rng, VERIFICATION_STATUS, n),
+        "Zip Code": [f"{z:03d}xx" for z in rng.integers(0, 1000, n)],
+        "Addr State": addr_state,
+        "Avg Cur Bal": avg_cur_bal,
+        "Tot Cur Bal": tot_cur_bal,
+        "Loan Id": np.arange(first_loan_id, first_loan_id + n),
+        "Loan Status": _choice(rng, LOAN_STATUS, n, [45, 35, 12, 3, 2, 2, 1]),
+        "Loan Amount": loan_amount,
+        "State": state,
+        "Funded Amount": funded_amount,
+        "Term": _choice(rng, ["36 months", "60 months"], n, [70, 30]),
+        "Int Rate": _with_nulls(rng, int_rate, null_rate).astype(float),
+        "Grade": grade,
+        "Issue Date": issue_date.strftime("%Y-%m-%d"),
+        "Pymnt Plan": rng.random(n) < 0.001,
+        "Type": np.where(is_joint, _choice(rng, ["Joint App", "JOINT"], n), _choice(rng, ["Individual", "INDIVIDUAL", "DIRECT_PAY"], n, [60, 35, 5])),
+        "Purpose": _choice(rng, PURPOSES, n),
+        "Description": _with_nulls(rng, _choice(rng, DESCRIPTIONS, n), null_rate),
+    }
+    return pd.DataFrame(rows, columns=COLUMN_NAMES)
+
+
+def write_raw_csv(
+    path: str,
+    n: int,
+    null_rate: float = 0.05,
+    outlier_rate: float = 0.01,
+    seed: int = 0,
+    chunk_size: int = 1_000_000,
+) -> None:
+    """A function to write a large raw dataset to a CSV file in chunks
+    Args:
+        path: A string representing the path to the CSV file
+        n: The number of rows
+        null_rate: The share of nulls in the nullable columns
+        outlier_rate: The share of rows with an extreme value
+        seed: The seed of the random generator, every chunk uses its own seed derived from it
+        chunk_size: The number of rows generated at once
+    """
+    for i, start in enumerate(range(0, n, chunk_size)):
+        rows = generate_rows(min(chunk_size, n - start), null_rate, outlier_rate, seed + i, start)
+        rows.to_csv(path, mode="w" if i == 0 else "a", header=i == 0, index=False)
+
+
+def write_states_map(path: str) -> None:
+    """A function to write the state code to state name map used by the pipeline
+    Args:
+        path: A string representing the path to the JSON file
+    """
+    with open(path, "w") as f:
+        json.dump(STATES, f, indent=4)
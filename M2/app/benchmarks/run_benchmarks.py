@@ -0,0 +1,209 @@
+import argparse
+import json
+import os
+import tempfile
+import time
+import tracemalloc
+import pandas as pd
+from benchmarks.generate_data import write_raw_csv, write_states_map
+from src import clean
+from src.artifacts import registry
+from src.db import save_to_db
+from src.instrumentation import MemorySink, get_sink, set_sink, pipeline, run_stage
+
+"""
+A benchmark suite for the cleaning pipeline which includes the following functions:
+- summarize : A function to turn the instrumentation records into throughput figures
+- benchmark_batch : A function to time every stage of clean.main
+- benchmark_stream : A function to time the streamed pipeline on batches of several sizes
+- benchmark_db_load : A function to time the bulk load of the cleaned data
+- run : A function to run the suite for one dataset size in a scratch directory
+
+The stages are measured by the instrumentation module.
+Run it from the app directory, e.g.
+    python -m benchmarks.run_benchmarks --rows 10000 1000000 10000000 --with-db
+"""
+
+BENCHMARK_DB_TABLE = "benchmark_fintech_clean"
+
+
+def summarize(records: list) -> list:
+    """A function to sum the instrumentation records of every stage and add their throughput,
+    the memory figures keep the largest value of the stage calls
+    Args:
+        records: The records collected by a MemorySink
+    Returns:
+        A list with one summary per (pipeline, stage), in the order the stages first ran
+    """
+    summaries = {}
+    for record in records:
+        key = (record["pipeline"], record["stage"])
+        summary = summaries.setdefault(
+            key,
+            {
+                "pipeline": record["pipeline"],
+                "stage": record["stage"],
+                "calls": 0,
+                "wall_s": 0.0,
+                "cpu_s": 0.0,
+                "rows_in": 0,
+                "rows_out": 0,
+                "tracemalloc_peak_mb": None,
+                "peak_rss_growth_mb": 0.0,
+                "process_peak_rss_mb": None,
+            },
+        )
+        summary["calls"] += 1
+        summary["wall_s"] += record["wall_s"]
+        summary["cpu_s"] += record["cpu_s"]
+        summary["rows_in"] += record["rows_in"] or 0
+        summary["rows_out"] += record["rows_out"] or 0
+        if record["tracemalloc_peak_mb"] is not None:
+            summary["tracemalloc_peak_mb"] = max(summary["tracemalloc_peak_mb"] or 0, record["tracemalloc_peak_mb"])
+        summary["peak_rss_growth_mb"] = max(summary["peak_rss_growth_mb"], record["peak_rss_growth_mb"])
+        summary["process_peak_rss_mb"] = max(summary["process_peak_rss_mb"] or 0, record["process_peak_rss_mb"])
+
+    for summary in summaries.values():
+        rows = max(summary["rows_in"], summary["rows_out"])
+        summary["rows_per_s"] = round(rows / summary["wall_s"], 1) if summary["wall_s"] else None
+        summary["wall_s"] = round(summary["wall_s"], 4)
+        summary["cpu_s"] = round(summary["cpu_s"], 4)
+    return list(summaries.values())
+
+
+@pipeline("main")
+def benchmark_batch(compact: bool = False) -> pd.DataFrame:
+    """A function to run every stage of clean.main, fitting the artifacts on the way
+    Args:
+        compact: A boolean to run the pipeline on compact dtypes
+    Returns:
+        The cleaned DataFrame
+    """
+    df = run_stage("load_data", clean.load_data, clean.DATASET_PATH, compact)
+    df, _ = clean.clean_and_fit(df, compact)
+    return df
+
+
+@pipeline("streamed_main")
+def benchmark_stream(batch_size: int, max_rows: int, compact: bool = False) -> float:
+    """A function to run the streamed pipeline (without the database write) on batches of one size
+    Args:
+        batch_size: The number of rows per batch
+        max_rows: The number of rows to stream
+        compact: A boolean to run the pipeline on compact dtypes
+    Returns:
+        The wall time of the whole stream in seconds
+    """
+    rows = 0
+    start = time.perf_counter()
+    for batch in clean.load_data_chunks(clean.DATASET_PATH, batch_size):
+        clean.clean_data(batch, compact)
+        rows += len(batch)
+        if rows >= max_rows:
+            break
+    return time.perf_counter() - start
+
+
+@pipeline("load_to_db")
+def benchmark_db_load(df: pd.DataFrame) -> None:
+    """A function to time the bulk load of the cleaned data into a scratch table
+    Args:
+        df: The cleaned DataFrame
+    """
+    run_stage("save_to_db", save_to_db, df, BENCHMARK_DB_TABLE, "replace")
+
+
+def run(rows: int, args: argparse.Namespace) -> list:
+    """A function to run the suite for one dataset size in a scratch directory
+    Args:
+        rows: The number of generated rows
+        args: The parsed command line arguments
+    Returns:
+        A list of the stage measurements
+    """
+    results = []
+    app_dir = os.getcwd()
+    previous_sink = get_sink()
+    with tempfile.TemporaryDirectory(dir=args.workdir) as workdir:
+        os.chdir(workdir)
+        try:
+            for directory in ["data/encodings", "data/scalers", "models"]:
+                os.makedirs(directory)
+            write_states_map(clean.STATES_DICT_PATH)
+            registry.invalidate()
+
+            print(f"Generating {rows} rows")
+            write_raw_csv(clean.DATASET_PATH, rows, args.null_rate, args.outlier_rate, args.seed)
+
+            sink = MemorySink()
+            set_sink(sink)
+            if args.trace_memory:
+                tracemalloc.start()
+            df = benchmark_batch(args.compact)
+            if args.trace_memory:
+                tracemalloc.stop()
+            results += summarize(sink.records)
+
+            registry.preload_dirs(clean.ENCODINGS_DIR, clean.SCALERS_DIR)
+            for batch_size in args.stream_batch_sizes:
+                sink = MemorySink()
+                set_sink(sink)
+                wall = benchmark_stream(batch_size, min(rows, args.stream_rows), args.compact)
+                batches = [record for record in sink.records if record["stage"] == "init_cleaning"]
+                streamed_rows = sum(record["rows_in"] for record in batches)
+                stages = summarize(sink.records)
+                for stage in stages:
+                    stage["pipeline"] = f"streamed_main[batch={batch_size}]"
+                results += stages + [
+                    {
+                        "pipeline": f"streamed_main[batch={batch_size}]",
+                        "stage": "total",
+                        "calls": len(batches),
+                        "wall_s": round(wall, 4),
+                        "rows_in": streamed_rows,
+                        "rows_out": streamed_rows,
+                        "rows_per_s": round(streamed_rows / wall, 1) if wall else None,
+                    }
+                ]
+
+            if args.with_db:
+                sink = MemorySink()
+                set_sink(sink)
+                benchmark_db_load(df)
+                results += summarize(sink.records)
+        finally:
+            set_sink(previous_sink)
+            os.chdir(app_dir)
+
+    for result in results:
+        result["dataset_rows"] = rows
+        result["compact"] = args.compact
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark the fintech cleaning pipeline")
+    parser.add_argument("--rows", type=int, nargs="+", default=[10_000, 1_000_000, 10_000_000])
+    parser.add_argument("--null-rate", type=float, default=0.05)
+    parser.add_argument("--outlier-rate", type=float, default=0.01)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--stream-batch-sizes", type=int, nargs="+", default=[1, 500])
+    parser.add_argument("--stream-rows", type=int, default=2_000, help="rows streamed per batch size")
+    parser.add_argument("--compact", action="store_true", help="run the pipeline on compact dtypes")
+    parser.add_argument("--trace-memory", action="store_true", help="measure per stage allocations with tracemalloc (slower)")
+    parser.add_argument("--with-db", action="store_true", help="also time the load into the database")
+    parser.add_argument("--workdir", default=None, help="where the scratch directories are created")
+    parser.add_argument("--output", default=None, help="JSON lines file the results are appended to")
+    args = parser.parse_args()
+
+    for rows in args.rows:
+        results = run(rows, args)
+        print(pd.DataFrame(results).to_string(index=False))
+        if args.output:
+            with open(args.output, "a") as f:
+                for result in results:
+                    f.write(json.dumps(result) + "\n")
+
+
+if __name__ == "__main__":
+    main()
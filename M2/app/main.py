@@ -1,4 +1,6 @@
 from src import clean
+from src.db import load_loan_ids, load_running_aggregates
+from src.dedupe import LoanIdCache
 from scripts.run_producer import start_producer, stop_container
 from scripts.run_consumer import start_consumer, consume_until_eof
 
@@ -6,13 +8,37 @@ ID = "52_4509"
 KAFKA_URL = "localhost:9092"
 KAFKA_INTERNAL_URL = "kafka:29092"
 TOPIC_NAME = "fintech-topic"
+MAX_BATCH_ROWS = 500
+MAX_BATCH_WAIT_SECONDS = 1.0
+DEDUPE_CACHE_SIZE = 1_000_000
+# Stream the raw file in chunks when it does not fit in memory
+CHUNKED_CLEANING = False
+# Clean the raw file on this many processes, None keeps the single process pipeline
+PARALLEL_WORKERS = None
+# Run the batch cleaning on category and downcast numeric dtypes to cut its peak memory
+COMPACT_DTYPES = False
 
 if __name__ == "__main__":
     try:
-        clean.main()
+        if CHUNKED_CLEANING:
+            clean.chunked_main(compact=COMPACT_DTYPES)
+        elif PARALLEL_WORKERS:
+            clean.parallel_main(PARALLEL_WORKERS, compact=COMPACT_DTYPES)
+        else:
+            clean.main(COMPACT_DTYPES)
+        clean.preload_artifacts()
+        dedupe_cache = LoanIdCache(DEDUPE_CACHE_SIZE)
+        dedupe_cache.warm(
+            reversed(load_loan_ids(clean.CLEANED_DATA_DB_TABLE, DEDUPE_CACHE_SIZE))
+        )
+        # The dashboard aggregates are kept up to date with every streamed batch
+        aggregates = load_running_aggregates()
         consumer = start_consumer(KAFKA_INTERNAL_URL, TOPIC_NAME)
         id = start_producer(ID, KAFKA_URL, TOPIC_NAME)
-        consume_until_eof(consumer)
+        consume_until_eof(
+            consumer, MAX_BATCH_ROWS, MAX_BATCH_WAIT_SECONDS, dedupe_cache, aggregates
+        )
+        print(dedupe_cache.stats())
         consumer.close()
     except Exception as e:
         print(f"An error{e} occurred")
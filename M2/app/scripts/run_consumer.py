@@ -3,7 +3,9 @@ import json
 import pandas as pd
 from kafka import KafkaConsumer
 from src.clean import streamed_main
-
+from src.dedupe import LoanIdCache
+from src.aggregates import IncrementalAggregates
+from src.raw_columns import COLUMN_NAMES
 
 
 def start_consumer(KAFKA_INTERNAL_URL: str, TOPIC_NAME: str) -> KafkaConsumer:
@@ -38,29 +40,137 @@ def start_consumer(KAFKA_INTERNAL_URL: str, TOPIC_NAME: str) -> KafkaConsumer:
     return consumer
 
 
-def consume_until_eof(consumer: KafkaConsumer) -> None:
+def build_batch(records: list) -> pd.DataFrame:
     """
-    Consume messages until EOF
+    Build a DataFrame from a list of streamed records
+
+    Args:
+    records (list): List of message values (dicts)
+
+    Returns:
+    pd.DataFrame: DataFrame holding every expected column, missing ones filled with None
+    """
+
+    new_rows = pd.DataFrame(records)
+    for column in COLUMN_NAMES:
+        if column not in new_rows.columns:
+            new_rows[column] = None
+    return new_rows
+
+
+def drop_seen_records(records: list, dedupe_cache: LoanIdCache) -> list:
+    """
+    Drop the records whose loan_id was already processed or repeats within the batch
+
+    Args:
+    records (list): List of message values (dicts)
+    dedupe_cache (LoanIdCache): Cache of the already processed loan_ids
+
+    Returns:
+    list: The records that still need to be processed
+    """
+
+    unique_records = []
+    batch_ids = set()
+    for record in records:
+        loan_id = record.get("Loan Id")
+        if loan_id is not None and (loan_id in batch_ids or dedupe_cache.seen(loan_id)):
+            continue
+        batch_ids.add(loan_id)
+        unique_records.append(record)
+
+    dropped = len(records) - len(unique_records)
+    if dropped:
+        print(f"Dropped {dropped} duplicate streamed rows. {dedupe_cache.stats()}")
+    return unique_records
+
+
+def flush_batch(
+    records: list,
+    dedupe_cache: LoanIdCache = None,
+    aggregates: IncrementalAggregates = None,
+) -> None:
+    """
+    Run the streamed pipeline once over the buffered records
+
+    Args:
+    records (list): List of message values (dicts)
+    dedupe_cache (LoanIdCache): Cache of the already processed loan_ids, no deduplication if None
+    aggregates (IncrementalAggregates): Running dashboard aggregates updated with the batch, not updated if None
+
+    Returns:
+
+    """
+
+    if dedupe_cache is not None:
+        records = drop_seen_records(records, dedupe_cache)
+    if not records:
+        return
+    print(f"Processing a batch of {len(records)} streamed rows")
+    saved = streamed_main(build_batch(records), aggregates)
+    # a batch that was not saved must not be dropped when it is replayed
+    if saved and dedupe_cache is not None:
+        for record in records:
+            if record.get("Loan Id") is not None:
+                dedupe_cache.add(record["Loan Id"])
+
+
+def consume_until_eof(
+    consumer: KafkaConsumer,
+    max_batch_rows: int = 500,
+    max_batch_wait: float = 1.0,
+    dedupe_cache: LoanIdCache = None,
+    aggregates: IncrementalAggregates = None,
+) -> None:
+    """
+    Consume messages until EOF, grouping them into micro-batches
+
+    A batch is flushed through the pipeline as soon as it holds max_batch_rows
+    records or its oldest record has waited max_batch_wait seconds, so latency
+    stays bounded by the time limit. max_batch_rows=1 processes every message
+    on its own.
 
     Args:
     consumer (KafkaConsumer): Kafka Consumer
+    max_batch_rows (int): Maximum number of rows in a batch
+    max_batch_wait (float): Maximum seconds a record waits before its batch is flushed
+    dedupe_cache (LoanIdCache): Cache used to drop already processed loan_ids, no deduplication if None
+    aggregates (IncrementalAggregates): Running dashboard aggregates updated with every batch, not updated if None
 
     Returns:
 
     """
 
+    records = []
+    batch_started = None
+
     while True:
-        message_batch = consumer.poll()
+        if batch_started is None:
+            timeout = max_batch_wait
+        else:
+            timeout = max(0.0, max_batch_wait - (time.monotonic() - batch_started))
+        message_batch = consumer.poll(
+            timeout_ms=int(timeout * 1000),
+            max_records=max_batch_rows - len(records),
+        )
 
         for _, messages in message_batch.items():
             for message in messages:
-                if not message.value == "EOF":
-                    new_rows = pd.DataFrame([message.value], columns=message.value.keys())
-                    column_names = ['Customer Id','Emp Title','Emp Length','Home Ownership','Annual Inc','Annual Inc Joint','Verification Status','Zip Code','Addr State','Avg Cur Bal','Tot Cur Bal','Loan Id','Loan Status','Loan Amount','State','Funded Amount','Term','Int Rate','Grade','Issue Date','Pymnt Plan','Type','Purpose','Description']
-                    for column in column_names:
-                        if column not in new_rows.columns:
-                            new_rows[column] = None
-                    streamed_main(new_rows)
-                else:   
+                if message.value == "EOF":
+                    flush_batch(records, dedupe_cache, aggregates)
                     print("EOF message received. Exiting..")
-                    return
\ No newline at end of file
+                    return
+                if batch_started is None:
+                    batch_started = time.monotonic()
+                records.append(message.value)
+                if len(records) >= max_batch_rows:
+                    flush_batch(records, dedupe_cache, aggregates)
+                    records = []
+                    batch_started = None
+
+        if batch_started is not None and (
+            time.monotonic() - batch_started >= max_batch_wait
+        ):
+            flush_batch(records, dedupe_cache, aggregates)
+            records = []
+            batch_started = None
@@ -0,0 +1,156 @@
+import calendar
+import pandas as pd
+from typing import Dict
+from sqlalchemy import inspect
+
+"""
+A module for the pre-aggregated summary tables read by the dashboard which includes the following:
+- AGGREGATE_DB_TABLES : The database tables the summary tables are saved to
+- DATA_VERSION_DB_TABLE : The one row table marking when the summary tables were last saved
+- IncrementalAggregates : A class holding the loan counts and sums behind the summary tables
+- save_aggregates : A function to save the summary tables to the database
+- load_aggregates : A function to load the summary tables from the database
+- resume_aggregates : A function to rebuild the aggregates from the database, empty if there are none yet
+
+The summary tables are:
+- monthly_loan_counts : year, month_number, month, loan_count
+- grade_distribution : grade, loan_count, percentage
+- state_loan_amount : state, state_name, loan_count, loan_amount_sum, loan_amount_mean
+
+Every writer of the loans table saves the summary tables with it, so the data version
+(loan_count, updated_at) tells the dashboard the loans changed without scanning them.
+"""
+
+AGGREGATE_DB_TABLES = {
+    "monthly_loan_counts": "fintech_monthly_loan_counts",
+    "grade_distribution": "fintech_grade_distribution",
+    "state_loan_amount": "fintech_state_loan_amount",
+}
+DATA_VERSION_DB_TABLE = "fintech_data_version"
+
+
+class IncrementalAggregates:
+    """A class holding the counts and sums behind the summary tables
+
+    Only counts and sums are kept, so loans can be added to (or removed from)
+    the aggregates batch by batch without reading the loans already aggregated.
+    """
+
+    def __init__(self) -> None:
+        self.monthly_counts = pd.Series(
+            dtype="int64", index=pd.MultiIndex.from_arrays([[], []], names=["year", "month_number"])
+        )
+        self.grade_counts = pd.Series(dtype="int64", index=pd.Index([], name="grade"))
+        self.state_sums = pd.DataFrame(
+            {"loan_count": pd.Series(dtype="int64"), "loan_amount_sum": pd.Series(dtype="float64")},
+            index=pd.MultiIndex.from_arrays([[], []], names=["state", "state_name"]),
+        )
+
+    def update(self, df: pd.DataFrame, sign: int = 1) -> None:
+        """A function to add a batch of loans to the aggregates
+        Args:
+            df: A pandas DataFrame with the issue_date, grade, state, state_name and loan_amount columns
+            sign: 1 to add the loans, -1 to remove loans that were added before
+        """
+        issue_date = pd.to_datetime(df["issue_date"])
+        monthly_counts = issue_date.groupby(
+            [issue_date.dt.year.rename("year"), issue_date.dt.month.rename("month_number")]
+        ).size()
+        grade_counts = df.groupby("grade", observed=True).size()
+        state_sums = df.groupby(["state", "state_name"], observed=True)["loan_amount"].agg(
+            loan_count="count", loan_amount_sum="sum"
+        )
+
+        self.monthly_counts = self.monthly_counts.add(sign * monthly_counts, fill_value=0)
+        self.grade_counts = self.grade_counts.add(sign * grade_counts, fill_value=0)
+        self.state_sums = self.state_sums.add(sign * state_sums, fill_value=0)
+
+    def merge(self, other: "IncrementalAggregates") -> None:
+        """A function to add the loans of other aggregates, e.g. the ones of another process
+        Args:
+            other: An IncrementalAggregates of loans that were not added to these aggregates
+        """
+        self.monthly_counts = self.monthly_counts.add(other.monthly_counts, fill_value=0)
+        self.grade_counts = self.grade_counts.add(other.grade_counts, fill_value=0)
+        self.state_sums = self.state_sums.add(other.state_sums, fill_value=0)
+
+    @classmethod
+    def from_tables(cls, tables: Dict[str, pd.DataFrame]) -> "IncrementalAggregates":
+        """A function to rebuild the aggregates from their summary tables
+        Args:
+            tables: A dictionary of the summary tables, as returned by tables
+        Returns:
+            An IncrementalAggregates
+        """
+        aggregates = cls()
+        aggregates.monthly_counts = tables["monthly_loan_counts"].set_index(
+            ["year", "month_number"]
+        )["loan_count"]
+        aggregates.grade_counts = tables["grade_distribution"].set_index("grade")["loan_count"]
+        aggregates.state_sums = tables["state_loan_amount"].set_index(["state", "state_name"])[
+            ["loan_count", "loan_amount_sum"]
+        ]
+        return aggregates
+
+    def tables(self) -> Dict[str, pd.DataFrame]:
+        """A function to build the summary tables
+        Returns:
+            A dictionary of the summary table names to pandas DataFrames
+        """
+        monthly = self.monthly_counts[self.monthly_counts > 0].astype("int64").rename("loan_count").reset_index()
+        monthly = monthly.astype({"year": "int64", "month_number": "int64"})
+        monthly.insert(2, "month", monthly["month_number"].map(lambda month: calendar.month_name[month]))
+        monthly = monthly.sort_values(["year", "month_number"], ignore_index=True)
+
+        grades = self.grade_counts[self.grade_counts > 0].astype("int64").rename("loan_count").reset_index()
+        grades["percentage"] = grades["loan_count"] / grades["loan_count"].sum() * 100
+        grades = grades.sort_values("grade", ignore_index=True)
+
+        states = self.state_sums[self.state_sums["loan_count"] > 0].reset_index()
+        states = states.astype({"loan_count": "int64", "loan_amount_sum": "float64"})
+        states["loan_amount_mean"] = states["loan_amount_sum"] / states["loan_count"]
+        states = states.sort_values("loan_amount_mean", ascending=False, ignore_index=True)
+
+        return {
+            "monthly_loan_counts": monthly,
+            "grade_distribution": grades,
+            "state_loan_amount": states,
+        }
+
+
+def save_aggregates(aggregates: IncrementalAggregates, con) -> None:
+    """A function to save the summary tables to the database, replacing the previous ones,
+    and mark the new data version
+    Args:
+        aggregates: An IncrementalAggregates
+        con: A SQLAlchemy engine or connection
+    """
+    for name, table in aggregates.tables().items():
+        table.to_sql(AGGREGATE_DB_TABLES[name], con=con, if_exists="replace", index=False)
+    version = pd.DataFrame(
+        {"loan_count": [int(aggregates.grade_counts.sum())], "updated_at": [pd.Timestamp.now(tz="UTC")]}
+    )
+    version.to_sql(DATA_VERSION_DB_TABLE, con=con, if_exists="replace", index=False)
+
+
+def load_aggregates(con) -> Dict[str, pd.DataFrame]:
+    """A function to load the summary tables from the database
+    Args:
+        con: A SQLAlchemy engine or connection
+    Returns:
+        A dictionary of the summary table names to pandas DataFrames
+    """
+    return {name: pd.read_sql_table(table, con) for name, table in AGGREGATE_DB_TABLES.items()}
+
+
+def resume_aggregates(con) -> IncrementalAggregates:
+    """A function to rebuild the aggregates from the summary tables in the database
+    Args:
+        con: A SQLAlchemy engine or connection
+    Returns:
+        An IncrementalAggregates, empty if the summary tables do not exist yet
+    """
+    existing = inspect(con)
+    if all(existing.has_table(table) for table in AGGREGATE_DB_TABLES.values()):
+        return IncrementalAggregates.from_tables(load_aggregates(con))
+    return IncrementalAggregates()
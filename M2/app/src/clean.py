@@ -1,11 +1,38 @@
 import pandas as pd
+import numpy as np
 import os
-from src.init_cleaning import init_cleaning
-from src.handling_outliers import handling_outliers, handling_int_rate_outliers
-from src.handling_missing import handle_missing
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from src.init_cleaning import init_cleaning, rename_columns
+from src.handling_outliers import (
+    handling_outliers,
+    handling_int_rate_outliers,
+    OUTLIERS_CAPS_PATH,
+)
+from src.handling_missing import (
+    handle_missing,
+    emp_length_coefficients_path,
+    int_rate_sums,
+    save_int_rate_means,
+    MEANS_DICT_PATH,
+)
 from src.handling_inconsistency import handle_inconsistencies
-from src.transformation import transform, transform_grade
-from src.db import save_to_db, add_rows_to_db
+from src.transformation import (
+    transform,
+    transform_grade,
+    add_features,
+    save_min_max_scaler,
+    ENCODINGS_DIR,
+    SCALERS_DIR,
+    CATEGORICAL_COLUMNS,
+    SCALED_COLUMNS,
+)
+from src.artifacts import registry
+from src.lookup_table import LookupTable
+from src.aggregates import IncrementalAggregates, AGGREGATE_DB_TABLES
+from src.dtypes import compact_frame, compact_read_dtypes
+from src.instrumentation import pipeline, run_stage
+from src.db import save_to_db, add_rows_to_db, save_running_aggregates
 
 
 """
@@ -13,7 +40,26 @@ The clean module for the transformation pipeline which includes the following fu
 - drop_extra_columns
 - load_data
 - save_data
+- load_data_chunks
+- save_summary_tables
+- load_saved_aggregates
+- seed_aggregates
+- preload_artifacts
+- clean_and_fit
+- clean_data
+- clean_and_aggregate
+- unseen_loan_ids
+- sample_for_fitting
+- scaled_column_bounds
+- fit_scalers
+- fit_on_sample
+- split_partitions
+- map_in_processes
+- clean_partitions
 - main : A function to handle the main transformation pipeline from loading the data to handling outliers, missing values, inconsistencies, and transformations
+- streamed_main : The same pipeline for streamed batches using the fitted artifacts
+- chunked_main : The same pipeline for raw files larger than memory, streamed in chunks
+- parallel_main : The same pipeline run on several processes
 """
 
 
@@ -25,6 +71,10 @@ LOOKUP_TABLE_DB_TABLE = "lookup_table_MET_P1_52_4509"
 STATES_DICT_PATH = "./data/usa_state_name_code_map.json"
 EMP_LENGTH_MODEL_PATH = "./models/emp_length_model.pkl"
 STREAMED_RAW_DATA_PATH = "./data/streamed_raw_data.csv"
+# The summary tables of the dashboard, saved next to the cleaned data
+AGGREGATES_PATHS = {name: f"./data/{table}.csv" for name, table in AGGREGATE_DB_TABLES.items()}
+CHUNK_SIZE = 100_000
+FIT_SAMPLE_SIZE = 200_000
 
 
 def drop_extra_columns(df: pd.DataFrame) -> pd.DataFrame:
@@ -63,28 +113,376 @@ def drop_extra_columns(df: pd.DataFrame) -> pd.DataFrame:
     return df
 
 
-def load_data(path: str = DATASET_PATH) -> pd.DataFrame:
+def load_data(path: str = DATASET_PATH, compact: bool = False) -> pd.DataFrame:
     """A function to load a dataset from a CSV file
     Args:
         DATASET_PATH: A string representing the path to the dataset
+        compact: A boolean to read the low cardinality string columns as categories
     Returns:
         A pandas DataFrame
     """
+    if compact:
+        return pd.read_csv(path, dtype=compact_read_dtypes(path))
     return pd.read_csv(path)
 
 
-def save_original_data(df: pd.DataFrame, lookup_df: pd.DataFrame) -> None:
-    """A function to save the cleaned data and the lookup table each as a CSV file
+def load_data_chunks(path: str = DATASET_PATH, chunk_size: int = CHUNK_SIZE):
+    """A function to load a dataset from a CSV file in chunks
+    Args:
+        path: A string representing the path to the dataset
+        chunk_size: The number of rows in each chunk
+    Returns:
+        An iterator of pandas DataFrames
+    """
+    return pd.read_csv(path, chunksize=chunk_size)
+
+
+def save_original_data(
+    df: pd.DataFrame, lookup_df: pd.DataFrame, aggregates: IncrementalAggregates = None
+) -> None:
+    """A function to save the cleaned data, the lookup table and the summary tables each as a CSV file
     Args:
         df: A pandas DataFrame
         lookup_df: A pandas DataFrame
+        aggregates: The IncrementalAggregates of the cleaned data, None to skip them
     """
     print("Saving cleaned data to csv")
     df.to_csv(CLEANED_DATA_PATH)
     lookup_df.to_csv(LOOKUP_DF_PATH, index=False)
+    if aggregates is not None:
+        save_summary_tables(aggregates)
+
+
+def save_summary_tables(aggregates: IncrementalAggregates) -> None:
+    """A function to save the summary tables of the cleaned data each as a CSV file
+    Args:
+        aggregates: The IncrementalAggregates of the cleaned data
+    """
+    for name, table in aggregates.tables().items():
+        table.to_csv(AGGREGATES_PATHS[name], index=False)
+
+
+def load_saved_aggregates() -> IncrementalAggregates:
+    """A function to load the summary tables saved next to the cleaned data
+    Returns:
+        An IncrementalAggregates, None if the summary tables were not saved
+    """
+    if not all(os.path.exists(path) for path in AGGREGATES_PATHS.values()):
+        return None
+    return IncrementalAggregates.from_tables(
+        {name: pd.read_csv(path, keep_default_na=False) for name, path in AGGREGATES_PATHS.items()}
+    )
+
+
+def seed_aggregates(aggregates: IncrementalAggregates) -> None:
+    """A function to replace the dashboard summary tables with the aggregates of the loaded data,
+    called whenever the cleaned data table is loaded so the summary tables describe it
+    Args:
+        aggregates: The IncrementalAggregates of the cleaned data, None if they were not saved
+    """
+    if aggregates is None:
+        print("No saved dashboard aggregates, the summary tables are left as they are")
+        return
+    print("Saving dashboard aggregates to database")
+    run_stage("save_aggregates", save_running_aggregates, aggregates)
+
+
+def preload_artifacts() -> None:
+    """A function to load every fitted artifact into the shared registry
+    so the streamed pipeline does not read them from disk on every batch
+    """
+    registry.preload(
+        json_paths=[
+            OUTLIERS_CAPS_PATH,
+            MEANS_DICT_PATH,
+            STATES_DICT_PATH,
+            emp_length_coefficients_path(EMP_LENGTH_MODEL_PATH),
+        ],
+    )
+    registry.preload_dirs(ENCODINGS_DIR, SCALERS_DIR)
+
+
+def clean_and_fit(
+    df: pd.DataFrame, compact: bool = False, aggregates: IncrementalAggregates = None
+) -> tuple:
+    """A function to run the cleaning pipeline on raw data while building the lookup table,
+    fitting every artifact that does not exist yet
+    Args:
+        df: A pandas DataFrame of raw data
+        compact: A boolean to run the pipeline on compact dtypes, see compact_frame
+        aggregates: An IncrementalAggregates the cleaned rows are added to before their
+            grade, state and loan_amount columns are dropped, None to skip it
+    Returns:
+        A tuple of the cleaned DataFrame and the lookup table
+    """
+    print("Creating lookup table")
+    lookup = LookupTable()
+    print("Starting transformation pipeline")
+    df = run_stage("init_cleaning", init_cleaning, df)
+    if compact:
+        df = run_stage("compact_frame", compact_frame, df)
+    print("Handling inconsistencies")
+    df = run_stage("handle_inconsistencies", handle_inconsistencies, df, lookup)
+    print("Handling outliers")
+    df = run_stage("handling_outliers", handling_outliers, df)
+    df = run_stage("transform_grade", transform_grade, df, lookup)
+    print("Handling missing values")
+    df = run_stage(
+        "handle_missing", handle_missing, df, lookup, EMP_LENGTH_MODEL_PATH
+    )
+    df = run_stage("handling_int_rate_outliers", handling_int_rate_outliers, df)
+    print("Transforming data")
+    df = run_stage("transform", transform, df, STATES_DICT_PATH, lookup, compact)
+    if aggregates is not None:
+        run_stage("update_aggregates", aggregates.update, df)
+    df = run_stage("drop_extra_columns", drop_extra_columns, df)
+    if compact:
+        df = run_stage("compact_frame", compact_frame, df)
+
+    return df, lookup.to_frame()
+
+
+def clean_data(
+    df: pd.DataFrame,
+    compact: bool = False,
+    aggregates: IncrementalAggregates = None,
+    drop_columns: bool = True,
+) -> pd.DataFrame:
+    """A function to run the cleaning pipeline on raw data using the fitted artifacts,
+    without building a lookup table
+    Args:
+        df: A pandas DataFrame of raw data
+        compact: A boolean to run the pipeline on compact dtypes, see compact_frame
+        aggregates: An IncrementalAggregates the cleaned rows are added to before their
+            grade, state and loan_amount columns are dropped, None to skip it
+        drop_columns: False to keep the columns drop_extra_columns removes
+    Returns:
+        A pandas DataFrame
+    """
+    print("Starting transformation pipeline")
+    df = run_stage("init_cleaning", init_cleaning, df)
+    if compact:
+        df = run_stage("compact_frame", compact_frame, df)
+    print("Handling inconsistencies")
+    df = run_stage("handle_inconsistencies", handle_inconsistencies, df)
+    print("Handling outliers")
+    df = run_stage("handling_outliers", handling_outliers, df)
+    df = run_stage("transform_grade", transform_grade, df)
+    print("Handling missing values")
+    df = run_stage(
+        "handle_missing", handle_missing, df, model_path=EMP_LENGTH_MODEL_PATH
+    )
+    df = run_stage("handling_int_rate_outliers", handling_int_rate_outliers, df)
+    print("Transforming data")
+    df = run_stage("transform", transform, df, STATES_DICT_PATH, compact=compact)
+    if aggregates is not None:
+        run_stage("update_aggregates", aggregates.update, df)
+    if drop_columns:
+        df = run_stage("drop_extra_columns", drop_extra_columns, df)
+    if compact:
+        df = run_stage("compact_frame", compact_frame, df)
+    return df
+
+
+def clean_and_aggregate(df: pd.DataFrame, compact: bool = False) -> tuple:
+    """A function to clean raw data using the fitted artifacts and aggregate the cleaned rows,
+    run by the worker processes of clean_partitions
+    Args:
+        df: A pandas DataFrame of raw data
+        compact: A boolean to run the pipeline on compact dtypes, see compact_frame
+    Returns:
+        A tuple of the cleaned DataFrame and its IncrementalAggregates
+    """
+    aggregates = IncrementalAggregates()
+    return clean_data(df, compact, aggregates), aggregates
+
+
+def unseen_loan_ids(loan_ids, seen_loan_ids: set) -> np.ndarray:
+    """A function to find the loan_ids seen for the first time and remember them,
+    so duplicates are removed across chunks and not only within a chunk
+    Args:
+        loan_ids: A pandas Series or Index of loan_ids
+        seen_loan_ids: The loan_ids of the previous chunks, updated in place
+    Returns:
+        A boolean array, True for the first row of every loan_id that was not seen before
+    """
+    seen = np.fromiter(
+        (loan_id in seen_loan_ids for loan_id in loan_ids), dtype=bool, count=len(loan_ids)
+    )
+    unseen = ~seen & ~pd.Index(loan_ids).duplicated()
+    seen_loan_ids.update(loan_ids[unseen])
+    return unseen
+
+
+def sample_for_fitting(
+    chunks, sample_size: int = FIT_SAMPLE_SIZE, seed: int = 0
+) -> pd.DataFrame:
+    """A function to draw the rows the artifacts are fitted on from a stream of chunks
+    - a uniform random sample of at most sample_size rows
+    - plus the first row of every value of the encoded columns, so the encodings
+      and the per grade caps cover every category of the full file
+    The first rows come first and in file order, so the categories are met in the order
+    of the full file and the one-hot columns are the same as the ones of main.
+    The int_rate means are computed from every row while streaming and saved
+    if they do not exist yet, so every (state, grade) of the full file gets its exact mean.
+    Args:
+        chunks: An iterator of pandas DataFrames of raw data, indexed by their row number in the file
+        sample_size: The number of randomly sampled rows
+        seed: The seed of the random sample
+    Returns:
+        A pandas DataFrame of raw data with renamed columns
+    """
+    rng = np.random.default_rng(seed)
+    sample = None
+    coverage_rows = []
+    seen_values = {column: pd.Series(dtype=object) for column in CATEGORICAL_COLUMNS}
+    seen_loan_ids = set()
+    int_rate = None
+
+    for chunk in chunks:
+        chunk = rename_columns(chunk)
+        chunk = chunk[unseen_loan_ids(chunk["loan_id"], seen_loan_ids)]
+        sums = int_rate_sums(transform_grade(chunk[["state", "grade", "int_rate"]].copy()))
+        int_rate = sums if int_rate is None else int_rate.add(sums, fill_value=0)
+        for column in CATEGORICAL_COLUMNS:
+            firsts = chunk.drop_duplicates(subset=column)
+            new = firsts[~firsts[column].isin(seen_values[column])]
+            if not new.empty:
+                coverage_rows.append(new)
+                seen_values[column] = pd.concat(
+                    [seen_values[column], new[column].astype(object)], ignore_index=True
+                )
+
+        chunk = chunk.assign(_sample_key=rng.random(len(chunk)))
+        sample = chunk if sample is None else pd.concat([sample, chunk])
+        sample = sample.nsmallest(sample_size, "_sample_key")
+
+    if not os.path.exists(MEANS_DICT_PATH):
+        save_int_rate_means(int_rate)
+
+    coverage = pd.concat(coverage_rows)
+    coverage = coverage[~coverage.index.duplicated()].sort_index()
+    sample = pd.concat([coverage, sample.drop(columns="_sample_key")])
+    return sample[~sample["loan_id"].duplicated()]
+
+
+def scaled_column_bounds(df: pd.DataFrame) -> pd.DataFrame:
+    """A function to run the fitted pipeline on raw data up to the min-max scaling
+    and get the range of every scaled column
+    Args:
+        df: A pandas DataFrame of raw data
+    Returns:
+        A pandas DataFrame with the min and max rows of every scaled column
+    """
+    df = init_cleaning(df)
+    df = handle_inconsistencies(df)
+    df = handling_outliers(df)
+    df = transform_grade(df)
+    df = handle_missing(df, model_path=EMP_LENGTH_MODEL_PATH)
+    df = handling_int_rate_outliers(df)
+    df = add_features(df, STATES_DICT_PATH)
+    return df[list(SCALED_COLUMNS)].agg(["min", "max"])
+
 
+def fit_scalers(bounds, columns: list) -> None:
+    """A function to save the scalers of columns from their exact range over every row
+    Args:
+        bounds: An iterable of the ranges of the chunks, see scaled_column_bounds
+        columns: The scaled columns to save the scalers of
+    """
+    bounds = pd.concat(list(bounds))
+    for column in columns:
+        save_min_max_scaler(
+            column, bounds.loc["min", column].min(), bounds.loc["max", column].max()
+        )
+
+
+def fit_on_sample(
+    load_chunks, sample_size: int = FIT_SAMPLE_SIZE, compact: bool = False, map_chunks=map
+) -> pd.DataFrame:
+    """A function to fit every artifact that does not exist yet on raw data read in chunks
+    - the int_rate means and the encoded categories on every row, see sample_for_fitting
+    - the caps and the emp_length model on a bounded sample
+    - the scalers on the exact range of every row, once the caps and means they depend on are fitted
+    Args:
+        load_chunks: A function returning a new iterator of pandas DataFrames of raw data, called twice
+        sample_size: The number of randomly sampled rows
+        compact: A boolean to run the pipeline on compact dtypes, see compact_frame
+        map_chunks: The map function the ranges of the chunks are computed with
+    Returns:
+        The lookup table
+    """
+    unfitted_scalers = [
+        column for column in SCALED_COLUMNS
+        if not os.path.exists(f"{SCALERS_DIR}/{column}_scaler.pkl")
+    ]
+    print("Sampling raw data to fit the pipeline")
+    sample = sample_for_fitting(load_chunks(), sample_size)
+    _, lookup_df = clean_and_fit(sample, compact)
+    del sample
+    if unfitted_scalers:
+        print("Fitting the scalers on the range of the raw data")
+        fit_scalers(map_chunks(scaled_column_bounds, load_chunks()), unfitted_scalers)
+    return lookup_df
+
+
+def split_partitions(df: pd.DataFrame, workers: int = None) -> list:
+    """A function to split a DataFrame into one contiguous partition per worker
+    Args:
+        df: A pandas DataFrame
+        workers: The number of processes, the number of CPUs if None
+    Returns:
+        A list of pandas DataFrames, in their original order
+    """
+    workers = workers or os.cpu_count()
+    bounds = np.linspace(0, len(df), workers + 1, dtype=int)
+    return [df.iloc[start:end] for start, end in zip(bounds[:-1], bounds[1:]) if end > start]
+
+
+def map_in_processes(func, partitions: list, workers: int = None) -> list:
+    """A function to run a function on every partition on several processes,
+    every worker preloads the artifacts once
+    Args:
+        func: The function to run
+        partitions: A list of pandas DataFrames
+        workers: The number of processes, the number of CPUs if None
+    Returns:
+        A list of the results, in the order of the partitions
+    """
+    with ProcessPoolExecutor(max_workers=workers or os.cpu_count(), initializer=preload_artifacts) as executor:
+        return list(executor.map(func, partitions))
+
+
+def clean_partitions(
+    df: pd.DataFrame, workers: int = None, compact: bool = False
+) -> tuple:
+    """A function to clean raw data on several processes using the fitted artifacts
+    Duplicates are removed from the whole data first, then it is split into one contiguous
+    partition per worker, every worker preloads the artifacts once and the cleaned partitions
+    are concatenated in their original order
+    Args:
+        df: A pandas DataFrame of raw data
+        workers: The number of processes, the number of CPUs if None
+        compact: A boolean to run the pipeline on compact dtypes, see compact_frame
+    Returns:
+        A tuple of the cleaned DataFrame and its IncrementalAggregates
+    """
+    # init_cleaning only removes duplicates within a partition
+    df = init_cleaning(df).reset_index()
+    results = map_in_processes(
+        partial(clean_and_aggregate, compact=compact), split_partitions(df, workers), workers
+    )
+
+    aggregates = IncrementalAggregates()
+    for _, partition_aggregates in results:
+        aggregates.merge(partition_aggregates)
+    df = pd.concat([cleaned for cleaned, _ in results])
+    # the partitions have their own categories which concat turns back into object
+    return (compact_frame(df) if compact else df), aggregates
 
-def main() -> None:
+
+@pipeline("main")
+def main(compact: bool = False) -> None:
     """A function to handle the main transformation pipeline
     -load data
     - create lookup table
@@ -98,47 +496,34 @@ def main() -> None:
     - drop extra columns
     - save data to csvs
     - save data to database
-    if the data already exists, it will load the data and the lookup table
+    - seed the dashboard summary tables when the data is saved to the database
+    if the data already exists, it will load the data, the lookup table and the summary tables
     , skip the transformation pipeline and save the data to the database
+    Args:
+        compact: A boolean to run the pipeline on compact dtypes, see compact_frame
     """
 
     if os.path.exists(CLEANED_DATA_PATH) and os.path.exists(LOOKUP_DF_PATH):
         print("Data already exists")
         df = load_data(CLEANED_DATA_PATH)
         lookup_df = load_data(LOOKUP_DF_PATH)
+        aggregates = load_saved_aggregates()
     else:
         print("Loading raw data")
-        df = load_data(DATASET_PATH)
-        print("Creating lookup table")
-        lookup_df = pd.DataFrame(
-            columns=["column", "original", "imputed", "impute_type"]
-        )
-        print("Starting transformation pipeline")
-        df = init_cleaning(df)
-        print("Handling inconsistencies")
-        df, lookup_df = handle_inconsistencies(df, lookup_df, update_lookup=True)
-        print("Handling outliers")
-        df = handling_outliers(df)
-        df, lookup_df = transform_grade(df, lookup_df, update_lookup=True)
-        print("Handling missing values")
-        df, lookup_df = handle_missing(
-            df, lookup_df, EMP_LENGTH_MODEL_PATH, update_lookup=True
-        )
-        df = handling_int_rate_outliers(df)
-        print("Transforming data")
-        df, lookup_df = transform(df, lookup_df, STATES_DICT_PATH, update_lookup=True)
-        df = drop_extra_columns(df)
-
-        lookup_df = lookup_df.astype(str)
-        save_original_data(df, lookup_df)
+        df = run_stage("load_data", load_data, DATASET_PATH, compact)
+        aggregates = IncrementalAggregates()
+        df, lookup_df = clean_and_fit(df, compact, aggregates)
+        save_original_data(df, lookup_df, aggregates)
 
     print("Saving cleaned data to database")
-    save_to_db(df, CLEANED_DATA_DB_TABLE)
+    if run_stage("save_to_db", save_to_db, df, CLEANED_DATA_DB_TABLE):
+        seed_aggregates(aggregates)
     print("Saving lookup table to database")
     save_to_db(lookup_df, LOOKUP_TABLE_DB_TABLE)
 
 
-def streamed_main(df: pd.DataFrame) -> None:
+@pipeline("streamed_main")
+def streamed_main(df: pd.DataFrame, aggregates: IncrementalAggregates = None) -> bool:
     """A function to handle the main transformation pipeline for streamed data
     -load data
     - create lookup table
@@ -154,9 +539,14 @@ def streamed_main(df: pd.DataFrame) -> None:
     - save data to database
     if the data already exists, it will load the data and the lookup table
     , skip the transformation pipeline and save the data to the database
+    the running dashboard aggregates are updated with the inserted rows of the batch
+    and saved to the database with them, see add_rows_to_db
 
     Args:
         df: A pandas DataFrame representing the data to be cleaned and transformed
+        aggregates: The running IncrementalAggregates of the dashboard, None to skip them
+    Returns:
+        True if the batch was saved to the database
     """
 
     # if os.path.exists(STREAMED_RAW_DATA_PATH):
@@ -168,23 +558,120 @@ def streamed_main(df: pd.DataFrame) -> None:
     #     streamed_raw_data = pd.DataFrame(columns=df.columns)
     # streamed_raw_data.to_csv(STREAMED_RAW_DATA_PATH, index=False)
 
-    dummy_lookup_df = pd.DataFrame(
-        columns=["column", "original", "imputed", "impute_type"]
+    df = clean_data(df, drop_columns=False)
+
+    print("Saving cleaned streamed data to database")
+    inserted = run_stage(
+        "add_rows_to_db",
+        add_rows_to_db,
+        run_stage("drop_extra_columns", drop_extra_columns, df),
+        CLEANED_DATA_DB_TABLE,
+        aggregates=aggregates,
+        aggregated_df=df,
     )
+    return inserted is not None
 
-    print("Starting transformation pipeline")
-    df = init_cleaning(df)
-    print("Handling inconsistencies")
-    df = handle_inconsistencies(df, dummy_lookup_df)
-    print("Handling outliers")
-    df = handling_outliers(df)
-    df = transform_grade(df, dummy_lookup_df)
-    print("Handling missing values")
-    df = handle_missing(df, dummy_lookup_df, EMP_LENGTH_MODEL_PATH)
-    df = handling_int_rate_outliers(df)
-    print("Transforming data")
-    df = transform(df, dummy_lookup_df, STATES_DICT_PATH)
-    df = drop_extra_columns(df)
 
-    print("Saving cleaned streamed data to database")
-    add_rows_to_db(df, CLEANED_DATA_DB_TABLE)
+@pipeline("chunked_main")
+def chunked_main(
+    chunk_size: int = CHUNK_SIZE, sample_size: int = FIT_SAMPLE_SIZE, compact: bool = False
+) -> None:
+    """A function to handle the main transformation pipeline on a raw file larger than memory
+    - first pass: stream the raw file, compute the int_rate means and the encoded categories
+      on every row and fit the caps and the emp_length model on a bounded sample
+    - second pass: stream the raw file through the fitted pipeline to fit the scalers
+      on the exact range of every row, see fit_on_sample
+    - third pass: stream the raw file again through the fitted pipeline and append
+      every cleaned chunk to the csv and the database, aggregating it for the dashboard
+    Peak memory is bounded by chunk_size and sample_size instead of the file size,
+    plus the set of loan_ids used to remove duplicates across chunks.
+    if the data already exists, it will stream the saved data to the database
+    the dashboard summary tables are seeded whenever the data is saved to the database
+    Args:
+        chunk_size: The number of rows in each chunk
+        sample_size: The number of randomly sampled rows the artifacts are fitted on
+        compact: A boolean to run the pipeline on compact dtypes, see compact_frame
+    Raises:
+        ValueError: If a chunk could not be saved, the table would only hold part of the data
+    """
+
+    if os.path.exists(CLEANED_DATA_PATH) and os.path.exists(LOOKUP_DF_PATH):
+        print("Data already exists")
+        print("Saving cleaned data to database")
+        for i, chunk in enumerate(load_data_chunks(CLEANED_DATA_PATH, chunk_size)):
+            chunk = chunk.set_index("loan_id")
+            if not save_to_db(chunk, CLEANED_DATA_DB_TABLE, "fail" if i == 0 else "append"):
+                if i == 0:
+                    break
+                raise ValueError(f"Chunk {i} was not saved, {CLEANED_DATA_DB_TABLE} is incomplete")
+            if i == 0:
+                seed_aggregates(load_saved_aggregates())
+        print("Saving lookup table to database")
+        save_to_db(load_data(LOOKUP_DF_PATH), LOOKUP_TABLE_DB_TABLE)
+        return
+
+    lookup_df = fit_on_sample(
+        lambda: load_data_chunks(DATASET_PATH, chunk_size), sample_size, compact
+    )
+    lookup_df.to_csv(LOOKUP_DF_PATH, index=False)
+
+    seen_loan_ids = set()
+    aggregates = IncrementalAggregates()
+    for i, chunk in enumerate(load_data_chunks(DATASET_PATH, chunk_size)):
+        print(f"Cleaning chunk {i}")
+        # duplicates are removed before the chunk is aggregated
+        chunk = rename_columns(chunk)
+        chunk = chunk[unseen_loan_ids(chunk["loan_id"], seen_loan_ids)]
+        df = clean_data(chunk, compact, aggregates)
+        df.to_csv(CLEANED_DATA_PATH, mode="w" if i == 0 else "a", header=i == 0)
+        if not save_to_db(df, CLEANED_DATA_DB_TABLE, "replace" if i == 0 else "append"):
+            raise ValueError(f"Chunk {i} was not saved, {CLEANED_DATA_DB_TABLE} is incomplete")
+
+    save_summary_tables(aggregates)
+    seed_aggregates(aggregates)
+    print("Saving lookup table to database")
+    save_to_db(lookup_df, LOOKUP_TABLE_DB_TABLE)
+
+
+@pipeline("parallel_main")
+def parallel_main(
+    workers: int = None, sample_size: int = FIT_SAMPLE_SIZE, compact: bool = False
+) -> None:
+    """A function to handle the main transformation pipeline on several processes
+    - fit the artifacts on the raw data, with the caps and the emp_length model
+      fitted on a bounded sample, see fit_on_sample
+    - clean the raw data in parallel partitions, see clean_partitions
+    - save data to csvs
+    - save data to database
+    - seed the dashboard summary tables when the data is saved to the database
+    if the data already exists, it will load the data, the lookup table and the summary tables
+    , skip the transformation pipeline and save the data to the database
+    Args:
+        workers: The number of processes, the number of CPUs if None
+        sample_size: The number of randomly sampled rows the artifacts are fitted on
+        compact: A boolean to run the pipeline on compact dtypes, see compact_frame
+    """
+
+    if os.path.exists(CLEANED_DATA_PATH) and os.path.exists(LOOKUP_DF_PATH):
+        print("Data already exists")
+        df = load_data(CLEANED_DATA_PATH)
+        lookup_df = load_data(LOOKUP_DF_PATH)
+        aggregates = load_saved_aggregates()
+    else:
+        print("Loading raw data")
+        df = run_stage("load_data", load_data, DATASET_PATH, compact)
+        lookup_df = fit_on_sample(
+            lambda: split_partitions(df, workers),
+            sample_size,
+            compact,
+            partial(map_in_processes, workers=workers),
+        )
+        print(f"Cleaning raw data on {workers or os.cpu_count()} processes")
+        df, aggregates = run_stage("clean_partitions", clean_partitions, df, workers, compact)
+        save_original_data(df, lookup_df, aggregates)
+
+    print("Saving cleaned data to database")
+    if save_to_db(df, CLEANED_DATA_DB_TABLE):
+        seed_aggregates(aggregates)
+    print("Saving lookup table to database")
+    save_to_db(lookup_df, LOOKUP_TABLE_DB_TABLE)
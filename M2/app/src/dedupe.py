@@ -0,0 +1,78 @@
+from collections import OrderedDict
+from typing import Any, Iterable
+
+"""
+A module for dropping replayed records before they reach the cleaning pipeline which includes the following:
+- LoanIdCache : A memory-bounded LRU set of the loan_ids that were already processed
+"""
+
+
+class LoanIdCache:
+    """A class to remember the most recently seen loan_ids
+
+    At most capacity ids are kept, the least recently seen ones are evicted first.
+    Every lookup is counted so the hit rate of the cache can be reported.
+    """
+
+    def __init__(self, capacity: int = 1_000_000) -> None:
+        self.capacity = capacity
+        self._ids = OrderedDict()
+        self.lookups = 0
+        self.hits = 0
+
+    @staticmethod
+    def _key(loan_id: Any) -> str:
+        return str(loan_id)
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    def add(self, loan_id: Any) -> None:
+        """A function to mark a loan_id as seen
+        Args:
+            loan_id: The loan_id of a processed record
+        """
+        key = self._key(loan_id)
+        self._ids[key] = None
+        self._ids.move_to_end(key)
+        if len(self._ids) > self.capacity:
+            self._ids.popitem(last=False)
+
+    def warm(self, loan_ids: Iterable[Any]) -> None:
+        """A function to fill the cache with already stored loan_ids
+        Args:
+            loan_ids: An iterable of loan_ids, the last ones are kept if there are too many
+        """
+        for loan_id in loan_ids:
+            self.add(loan_id)
+        print(f"Dedupe cache warmed with {len(self)} loan_ids")
+
+    def seen(self, loan_id: Any) -> bool:
+        """A function to check if a loan_id was already seen and count the lookup
+        Args:
+            loan_id: The loan_id of an incoming record
+        Returns:
+            True if the loan_id is in the cache
+        """
+        self.lookups += 1
+        key = self._key(loan_id)
+        if key in self._ids:
+            self.hits += 1
+            self._ids.move_to_end(key)
+            return True
+        return False
+
+    @property
+    def hit_rate(self) -> float:
+        """The share of lookups that found a duplicate"""
+        return self.hits / self.lookups if self.lookups else 0.0
+
+    def stats(self) -> str:
+        """A function to describe the cache usage
+        Returns:
+            A string with the size, lookups, hits and hit rate of the cache
+        """
+        return (
+            f"Dedupe cache: {len(self)} ids, {self.lookups} lookups, "
+            f"{self.hits} hits ({self.hit_rate:.1%} hit rate)"
+        )
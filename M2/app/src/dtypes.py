@@ -0,0 +1,68 @@
+import pandas as pd
+
+"""
+A module for the compact dtype mode of the pipeline which includes the following:
+- COMPACT_CATEGORY_COLUMNS : The low cardinality string columns stored as category
+- compact_read_dtypes : A function to get the dtypes a raw CSV file is read with in compact mode
+- compact_frame : A function to convert a DataFrame to the compact dtypes
+"""
+
+# The string columns are only edited with .str methods or filled with a value once they are categories
+COMPACT_CATEGORY_COLUMNS = [
+    "emp_title",
+    "home_ownership",
+    "verification_status",
+    "zip_code",
+    "addr_state",
+    "loan_status",
+    "state",
+    "type",
+    "purpose",
+    "description",
+    "grade",
+    "state_name",
+]
+# grade is numeric in the raw data and only becomes a letter in transform_grade
+COMPACT_NUMERIC_RAW_COLUMNS = ["grade"]
+
+
+def compact_read_dtypes(path: str) -> dict:
+    """A function to get the dtypes a raw CSV file is read with in compact mode,
+    so the low cardinality string columns never exist as object columns
+    Args:
+        path: A string representing the path to the CSV file
+    Returns:
+        A dictionary of the raw column names to their dtypes
+    """
+    header = pd.read_csv(path, nrows=0).columns
+    names = header.str.strip().str.lower().str.replace(" ", "_")
+    return {
+        column: "category"
+        for column, name in zip(header, names)
+        if name in COMPACT_CATEGORY_COLUMNS and name not in COMPACT_NUMERIC_RAW_COLUMNS
+    }
+
+
+def compact_frame(
+    df: pd.DataFrame, category_columns: list = COMPACT_CATEGORY_COLUMNS
+) -> pd.DataFrame:
+    """A function to convert a DataFrame to compact dtypes
+    - the string columns in category_columns become category
+    - the signed integer columns are downcast to the smallest integer type holding their values
+    - the float columns are downcast to float32
+    Boolean, unsigned (one-hot) and datetime columns are left as they are
+    Args:
+        df: A pandas DataFrame
+        category_columns: The string columns to convert to category
+    Returns:
+        A pandas DataFrame
+    """
+    for column in df.columns:
+        series = df[column]
+        if column in category_columns and series.dtype == object:
+            df[column] = series.astype("category")
+        elif pd.api.types.is_signed_integer_dtype(series):
+            df[column] = pd.to_numeric(series, downcast="integer")
+        elif pd.api.types.is_float_dtype(series):
+            df[column] = pd.to_numeric(series, downcast="float")
+    return df
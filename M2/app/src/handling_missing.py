@@ -1,36 +1,80 @@
 import pandas as pd
-from sklearn import linear_model
-import pickle as pkl
-import json
+import numpy as np
 import os
+from src.artifacts import registry, read_json, file_signature
+from src.lookup_table import LookupTable
 
 MEANS_DICT_PATH = 'data/means_dict.json'
+EMP_LENGTH_FEATURES = ['annual_inc_log', 'avg_cur_bal_log', 'tot_cur_bal_log']
 
 """
 A module for handling missing values in a DataFrame which includes the following functions:
 - handle_annual_inc_joint
+- read_int_rate_means
+- int_rate_sums
+- save_int_rate_means
 - handle_int_rate
+- fill_missing
 - handle_description
+- emp_length_coefficients_path
+- emp_length_model_signature
+- export_emp_length_coefficients
+- load_emp_length_coefficients
 - handle_emp_length
 - handle_emp_title
 - handle_missing : A function to handle missing values in a DataFrame using the above functions 
 """
 
-def handle_annual_inc_joint(df: pd.DataFrame, lookup_df: pd.DataFrame) -> pd.DataFrame:
+def handle_annual_inc_joint(df: pd.DataFrame, lookup: LookupTable = None) -> pd.DataFrame:
     """A function to handle the annual_inc_joint column and update the lookup table
     Args:
         df: A pandas DataFrame
-        lookup_df: A pandas DataFrame
+        lookup: The lookup table to add the entry to, skipped if None
     Returns:
-        A tuple of 2 pandas DataFrames
+        A pandas DataFrame
     """
     df["annual_inc_joint"] = df["annual_inc_joint"].fillna(df["annual_inc"])
     df['annual_inc_joint_log'] = df['annual_inc_joint_log'].fillna(df['annual_inc_log'])
 
-    new_row = pd.DataFrame([{'column': 'annual_inc_joint', 'original': 'nan', 'imputed': 'annual_inc', 'impute_type': 'custom'}])
-    lookup_df = pd.concat([lookup_df, new_row], ignore_index=True)
+    if lookup is not None:
+        lookup.add('annual_inc_joint', 'nan', 'annual_inc', 'custom')
+
+    return df
+
+
+def read_int_rate_means(path: str) -> pd.Series:
+    """A function to read the int_rate means as a Series indexed by (state, grade)
+    Args:
+        path: A string representing the path to the means dictionary
+    Returns:
+        A pandas Series
+    """
+    int_rate_data = read_json(path)['int_rate']
+    return pd.Series({
+        (state, grade): mean
+        for state, grades in int_rate_data.items()
+        for grade, mean in grades.items()
+    }, dtype='float64')
+
+
+def int_rate_sums(df: pd.DataFrame) -> pd.DataFrame:
+    """A function to sum and count the int_rate of every (state, grade),
+    so the means can be computed over data read in chunks
+    Args:
+        df: A pandas DataFrame with the state, grade and int_rate columns
+    Returns:
+        A pandas DataFrame indexed by (state, grade) with the sum and count columns
+    """
+    return df.groupby(['state', 'grade'], observed=True)['int_rate'].agg(['sum', 'count'])
+
 
-    return df, lookup_df
+def save_int_rate_means(sums: pd.DataFrame) -> None:
+    """A function to save the int_rate means of every (state, grade) in the format of handle_int_rate
+    Args:
+        sums: A pandas DataFrame of the sums and counts, see int_rate_sums
+    """
+    means = (sums['sum'] / sums['count']).unstack(fill_value=0)
+    registry.save_json(MEANS_DICT_PATH, {'int_rate': means.to_dict(orient='index')}, indent=4)
 
 
 def handle_int_rate(df: pd.DataFrame) -> pd.DataFrame:
@@ -42,86 +86,160 @@ def handle_int_rate(df: pd.DataFrame) -> pd.DataFrame:
     """
 
     if os.path.exists(MEANS_DICT_PATH):
-        with open(MEANS_DICT_PATH, 'r') as f:
-            int_rate_data = json.load(f)['int_rate']
-        df['int_rate'] = df.apply(lambda x: int_rate_data[x['state']][x['grade']] if pd.isnull(x['int_rate']) else x['int_rate'], axis=1)
+        int_rate_means = registry.load(MEANS_DICT_PATH, read_int_rate_means)
+        missing = df['int_rate'].isnull()
+        if missing.any():
+            keys = pd.MultiIndex.from_arrays([df.loc[missing, 'state'], df.loc[missing, 'grade']])
+            df.loc[missing, 'int_rate'] = int_rate_means.reindex(keys).to_numpy(dtype=df['int_rate'].dtype)
     else:
-        means_dict = df.groupby(['state', 'grade'])['int_rate'].mean().unstack(fill_value=0).to_dict(orient='index')
-        df['int_rate'] = df.groupby(['state','grade'])['int_rate'].transform(lambda x: x.fillna(x.mean()))
-        with open(MEANS_DICT_PATH, 'w') as f:
-            json.dump({'int_rate':means_dict}, f, indent=4)
+        means_dict = df.groupby(['state', 'grade'], observed=True)['int_rate'].mean().unstack(fill_value=0).to_dict(orient='index')
+        df['int_rate'] = df.groupby(['state','grade'], observed=True)['int_rate'].transform(lambda x: x.fillna(x.mean()))
+        registry.save_json(MEANS_DICT_PATH, {'int_rate':means_dict}, indent=4)
     return df
 
-def handle_description(df: pd.DataFrame, lookup_df: pd.DataFrame) -> pd.DataFrame:
-    """A function to handle the desc column
+def fill_missing(series: pd.Series, value: str) -> pd.Series:
+    """A function to fill the nulls of a column, adding the value to its categories if it is a category
     Args:
-        df: A pandas DataFrame
-        lookup_df: A pandas DataFrame
+        series: A pandas Series
+        value: The value the nulls are replaced with
     Returns:
-        A tuple of 2 pandas DataFrames
+        A pandas Series
     """
-    df['description'] = df['description'].fillna('missing')
-    new_row = pd.DataFrame([{'column': 'description', 'original': 'nan', 'imputed': 'missing', 'impute_type': 'custom'}])
-    lookup_df = pd.concat([lookup_df, new_row], ignore_index=True)
-    return df, lookup_df
+    if isinstance(series.dtype, pd.CategoricalDtype) and value not in series.cat.categories:
+        series = series.cat.add_categories([value])
+    return series.fillna(value)
 
-def handle_emp_length(df: pd.DataFrame, model_path: str = 'emp_length_model.pkl') -> pd.DataFrame:
-    """A function to handle the emp_length column
+def handle_description(df: pd.DataFrame, lookup: LookupTable = None) -> pd.DataFrame:
+    """A function to handle the desc column
     Args:
         df: A pandas DataFrame
-        model_path: A string representing the path to the model
+        lookup: The lookup table to add the entry to, skipped if None
     Returns:
         A pandas DataFrame
     """
+    df['description'] = fill_missing(df['description'], 'missing')
+    if lookup is not None:
+        lookup.add('description', 'nan', 'missing', 'custom')
+    return df
+
+def emp_length_coefficients_path(model_path: str) -> str:
+    """A function to get the path of the coefficients exported next to the emp_length model
+    Args:
+        model_path: A string representing the path to the pickled model
+    Returns:
+        A string representing the path to the JSON coefficients
+    """
+    return os.path.splitext(model_path)[0] + '_coef.json'
+
 
+def emp_length_model_signature(model_path: str) -> list:
+    """A function to get the signature of the pickled emp_length model the coefficients are exported from
+    Args:
+        model_path: A string representing the path to the pickled model
+    Returns:
+        A list of the modification time and size of the pickle
+    Raises:
+        FileNotFoundError: if the model does not exist
+    """
+    return file_signature(model_path)
+
+
+def export_emp_length_coefficients(model, model_path: str) -> dict:
+    """A function to export the coefficients of the fitted emp_length model to a JSON file,
+    together with the signature of its pickle
+    Args:
+        model: A fitted sklearn LinearRegression
+        model_path: A string representing the path to the pickled model
+    Returns:
+        A dictionary with the features, coefficients and intercept of the model
+    """
+    coefficients = {
+        'features': EMP_LENGTH_FEATURES,
+        'coef': [float(value) for value in model.coef_],
+        'intercept': float(model.intercept_),
+        'model_signature': emp_length_model_signature(model_path),
+    }
+    registry.save_json(emp_length_coefficients_path(model_path), coefficients, indent=4)
+    return coefficients
+
+
+def load_emp_length_coefficients(df: pd.DataFrame, model_path: str) -> dict:
+    """A function to load the coefficients of the emp_length model
+    - from the exported JSON file if it was exported from the current pickled model
+    - else from the pickled model, exporting its coefficients
+    - else by training a new model on the rows with an emp_length,
+      so deleting the pickle still retrains the model
+    Args:
+        df: A pandas DataFrame, used to train the model if there is none
+        model_path: A string representing the path to the pickled model
+    Returns:
+        A dictionary with the features, coefficients and intercept of the model
+    """
     try:
-        filename = model_path
-        model = pkl.load(open(filename
-                                , 'rb'))
+        signature = emp_length_model_signature(model_path)
+        try:
+            coefficients = registry.load_json(emp_length_coefficients_path(model_path))
+            if coefficients.get('model_signature') == signature:
+                return coefficients
+        except FileNotFoundError:
+            pass
+        model = registry.load_pickle(model_path)
     except FileNotFoundError:
         print('Model not found. Training a new model')
+        from sklearn import linear_model
+
         model = linear_model.LinearRegression()
         training_df = df[df['emp_length'].notnull()]
-        model.fit(training_df[['annual_inc_log', 'avg_cur_bal_log', 'tot_cur_bal_log']], training_df['emp_length'])
-        pkl.dump(model, open(filename, 'wb'))
-    
-    df['emp_length_predictions'] = model.predict(df[['annual_inc_log', 'avg_cur_bal_log', 'tot_cur_bal_log']])
-    df['emp_length_predictions'] = df['emp_length_predictions'].round()
-    df['emp_length_imputed'] = df['emp_length'].fillna(df['emp_length_predictions'])
-    df = df.drop(columns=['emp_length_predictions'])
+        model.fit(training_df[EMP_LENGTH_FEATURES], training_df['emp_length'])
+        registry.save_pickle(model_path, model)
+    return export_emp_length_coefficients(model, model_path)
+
+
+def handle_emp_length(df: pd.DataFrame, model_path: str = 'emp_length_model.pkl') -> pd.DataFrame:
+    """A function to handle the emp_length column
+    The linear model is only evaluated, as a dot product of its coefficients, on the rows missing emp_length
+    Args:
+        df: A pandas DataFrame
+        model_path: A string representing the path to the model
+    Returns:
+        A pandas DataFrame
+    """
+
+    coefficients = load_emp_length_coefficients(df, model_path)
+    df['emp_length_imputed'] = df['emp_length']
+    missing = df['emp_length'].isnull().to_numpy()
+    if missing.any():
+        features = df.loc[missing, coefficients['features']].to_numpy(dtype='float64')
+        predictions = np.round(features @ np.array(coefficients['coef']) + coefficients['intercept'])
+        df.loc[missing, 'emp_length_imputed'] = predictions.astype(df['emp_length'].dtype)
     return df
 
 
-def handle_emp_title(df: pd.DataFrame, lookup_df: pd.DataFrame) -> pd.DataFrame:
+def handle_emp_title(df: pd.DataFrame, lookup: LookupTable = None) -> pd.DataFrame:
     """A function to handle the emp_title column
     Args:
         df: A pandas DataFrame
-        lookup_df: A pandas DataFrame
+        lookup: The lookup table to add the entry to, skipped if None
     Returns:
-        A tuple of 2 pandas DataFrames
+        A pandas DataFrame
     """
-    df['emp_title'] = df['emp_title'].fillna('missing')
-    new_row = pd.DataFrame([{'column': 'emp_title', 'original': 'nan', 'imputed': 'missing', 'impute_type': 'custom'}])
-    lookup_df = pd.concat([lookup_df, new_row], ignore_index=True)
-    return df, lookup_df
+    df['emp_title'] = fill_missing(df['emp_title'], 'missing')
+    if lookup is not None:
+        lookup.add('emp_title', 'nan', 'missing', 'custom')
+    return df
 
-def handle_missing(df: pd.DataFrame, lookup_df: pd.DataFrame, model_path: str = 'emp_length_model.pkl', update_lookup: bool = False) -> pd.DataFrame:
+def handle_missing(df: pd.DataFrame, lookup: LookupTable = None, model_path: str = 'emp_length_model.pkl') -> pd.DataFrame:
     """A function to handle missing values in a DataFrame
     Args:
         df: A pandas DataFrame
-        lookup_df: A pandas DataFrame
+        lookup: The lookup table to add the entries to, skipped if None
         model_path: A string representing the path to the model
-        update_lookup: A boolean to update the lookup table
     Returns:
         A pandas DataFrame
     """
-    df , lookup_df = handle_annual_inc_joint(df, lookup_df)
+    df = handle_annual_inc_joint(df, lookup)
     df = handle_int_rate(df)
-    df, lookup_df = handle_description(df, lookup_df)
+    df = handle_description(df, lookup)
     df = handle_emp_length(df, model_path)
-    df , lookup_df= handle_emp_title(df, lookup_df)
-
-    if not update_lookup:
-        return df
-
-    return df, lookup_df
\ No newline at end of file
+    df = handle_emp_title(df, lookup)
+    return df
\ No newline at end of file
@@ -0,0 +1,140 @@
+import json
+import os
+import resource
+import time
+import tracemalloc
+from contextlib import contextmanager
+from datetime import datetime, timezone
+import pandas as pd
+
+"""
+A module for recording the cost of every pipeline stage which includes the following:
+- JsonLinesSink : A sink writing one JSON record per stage to a file
+- MemorySink : A sink keeping the records in a list
+- set_sink / get_sink : Functions to plug a sink in, recording is disabled while no sink is set
+- pipeline : A context manager labelling the stages run inside it
+- run_stage : A function to run a stage and record its wall time, CPU time, rows and memory
+
+The sink is configured from the environment when the module is imported:
+- PIPELINE_METRICS_PATH : the JSON lines file to write the records to
+- PIPELINE_TRACEMALLOC : set to 1 to also record the tracemalloc peak of every stage (slower)
+"""
+
+
+class JsonLinesSink:
+    """A sink appending every record as a JSON line to a file"""
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+
+    def emit(self, record: dict) -> None:
+        with open(self.path, "a") as f:
+            f.write(json.dumps(record) + "\n")
+
+
+class MemorySink:
+    """A sink keeping every record in memory"""
+
+    def __init__(self) -> None:
+        self.records = []
+
+    def emit(self, record: dict) -> None:
+        self.records.append(record)
+
+
+def _sink_from_env():
+    if os.environ.get("PIPELINE_TRACEMALLOC") == "1" and not tracemalloc.is_tracing():
+        tracemalloc.start()
+    path = os.environ.get("PIPELINE_METRICS_PATH")
+    return JsonLinesSink(path) if path else None
+
+
+_sink = _sink_from_env()
+_pipeline = None
+
+
+def set_sink(sink) -> None:
+    """A function to set the sink the stage records are sent to
+    Args:
+        sink: An object with an emit(record) method, None disables recording
+    """
+    global _sink
+    _sink = sink
+
+
+def get_sink():
+    """A function to get the current sink
+    Returns:
+        The current sink, None if recording is disabled
+    """
+    return _sink
+
+
+@contextmanager
+def pipeline(name: str):
+    """A context manager labelling the stages run inside it with a pipeline name
+    Args:
+        name: The name of the pipeline, e.g. main or streamed_main
+    """
+    global _pipeline
+    previous = _pipeline
+    _pipeline = name
+    try:
+        yield
+    finally:
+        _pipeline = previous
+
+
+def _rows(value) -> int:
+    if isinstance(value, tuple) and value:
+        value = value[0]
+    return len(value) if isinstance(value, pd.DataFrame) else None
+
+
+def run_stage(stage: str, func, /, *args, **kwargs):
+    """A function to run a pipeline stage and record its cost
+    The record holds the wall time, CPU time, rows in and out (of the first DataFrame
+    argument and of the returned DataFrame), the peak RSS of the process since it started,
+    how much the stage raised that peak and the tracemalloc peak of the stage when
+    tracemalloc is tracing
+    Args:
+        stage: The name of the stage
+        func: The stage function
+        args: The positional arguments of the stage
+        kwargs: The keyword arguments of the stage
+    Returns:
+        The result of the stage function
+    """
+    if _sink is None:
+        return func(*args, **kwargs)
+
+    tracing = tracemalloc.is_tracing()
+    if tracing:
+        start_memory = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+    rows_in = _rows(args[0]) if args else None
+    start_peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    start_wall = time.perf_counter()
+    start_cpu = time.process_time()
+
+    result = func(*args, **kwargs)
+
+    wall = time.perf_counter() - start_wall
+    cpu = time.process_time() - start_cpu
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    _sink.emit(
+        {
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "pid": os.getpid(),
+            "pipeline": _pipeline,
+            "stage": stage,
+            "wall_s": round(wall, 6),
+            "cpu_s": round(cpu, 6),
+            "rows_in": rows_in,
+            "rows_out": _rows(result),
+            "process_peak_rss_mb": round(peak_rss / 1024, 1),
+            "peak_rss_growth_mb": round((peak_rss - start_peak_rss) / 1024, 1),
+            "tracemalloc_peak_mb": round((tracemalloc.get_traced_memory()[1] - start_memory) / 2**20, 2) if tracing else None,
+        }
+    )
+    return result
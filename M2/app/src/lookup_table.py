@@ -0,0 +1,46 @@
+import pandas as pd
+
+"""
+A module for building the lookup table which includes the following:
+- LOOKUP_COLUMNS : The columns of the lookup table
+- LookupTable : An accumulator collecting the lookup entries of the cleaning stages
+"""
+
+LOOKUP_COLUMNS = ["column", "original", "imputed", "impute_type"]
+
+
+class LookupTable:
+    """An append-only accumulator for the lookup table entries
+
+    The entries are kept in a list and turned into a DataFrame once at the end,
+    instead of concatenating a new DataFrame for every entry. An entry that was
+    already added is ignored, so the table keeps the order the entries were first seen in.
+    """
+
+    def __init__(self) -> None:
+        self._records = []
+        self._keys = set()
+
+    def __len__(self) -> int:
+        return len(self._records)
+
+    def add(self, column: str, original, imputed, impute_type: str) -> None:
+        """A function to add an entry to the lookup table
+        Args:
+            column: The name of the column
+            original: The original value
+            imputed: The value it was replaced with
+            impute_type: How the value was replaced, e.g. custom or label-encoding
+        """
+        record = (str(column), str(original), str(imputed), str(impute_type))
+        if record in self._keys:
+            return
+        self._keys.add(record)
+        self._records.append(record)
+
+    def to_frame(self) -> pd.DataFrame:
+        """A function to build the lookup table
+        Returns:
+            A pandas DataFrame with the LOOKUP_COLUMNS, every value as a string
+        """
+        return pd.DataFrame(self._records, columns=LOOKUP_COLUMNS, dtype=str)
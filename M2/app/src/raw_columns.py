@@ -0,0 +1,31 @@
+"""
+A module for the columns of the raw fintech data which includes the following:
+- COLUMN_NAMES : The columns of every raw record, in the order of the raw file
+"""
+
+COLUMN_NAMES = [
+    "Customer Id",
+    "Emp Title",
+    "Emp Length",
+    "Home Ownership",
+    "Annual Inc",
+    "Annual Inc Joint",
+    "Verification Status",
+    "Zip Code",
+    "Addr State",
+    "Avg Cur Bal",
+    "Tot Cur Bal",
+    "Loan Id",
+    "Loan Status",
+    "Loan Amount",
+    "State",
+    "Funded Amount",
+    "Term",
+    "Int Rate",
+    "Grade",
+    "Issue Date",
+    "Pymnt Plan",
+    "Type",
+    "Purpose",
+    "Description",
+]
@@ -1,9 +1,47 @@
+import numpy as np
 import pandas as pd
 from typing import List, Tuple
-from sklearn.preprocessing import MinMaxScaler
-import json
-import pickle as pkl
 import os
+from src.artifacts import registry, file_signature
+from src.lookup_table import LookupTable
+from src.encoders import OneHotEncoder, factorize_normalized, read_one_hot_encoder
+
+ENCODINGS_DIR = "data/encodings"
+SCALERS_DIR = "data/scalers"
+
+# The encoded columns and their forced encoding type ("any" lets the threshold decide)
+CATEGORICAL_COLUMNS = {
+    "home_ownership": "any",
+    "verification_status": "any",
+    "purpose": "any",
+    "grade": "label-encoding",
+    "loan_status": "any",
+    "type": "any",
+    "state": "any",
+    "addr_state": "any",
+    "pymnt_plan": "label-encoding",
+}
+
+# The numeric grade ranges and their letters, grades above the last range have no letter
+GRADE_BINS = [
+    (1, 5, "A"),
+    (6, 10, "B"),
+    (11, 15, "C"),
+    (16, 20, "D"),
+    (21, 25, "E"),
+    (26, 30, "F"),
+    (31, 35, "G"),
+]
+GRADE_UPPER_EDGES = np.array([high for _, high, _ in GRADE_BINS])
+GRADE_LETTERS = np.array([letter for _, _, letter in GRADE_BINS] + [None], dtype=object)
+
+# The min-max scaled columns and the columns their normalized values are written to
+SCALED_COLUMNS = {
+    "int_rate_outliers_capped": "int_rate_normalized",
+    "loan_amount_sqrt": "loan_amount_sqrt_normalized",
+    "funded_amount_sqrt": "funded_amount_sqrt_normalized",
+    "installment_per_month": "installment_per_month_normalized",
+}
 
 """
 A file for transformation functions which includes three parts:
@@ -17,7 +55,12 @@ A file for transformation functions which includes three parts:
     - encode_and_update
     - encode_columns
 - Part 3: Functions to normalize columns in the DataFrame
+    - scaler_coefficients_path
+    - export_scaler_coefficients
+    - load_scaler_coefficients
+    - min_max_transform
     - min_max_scale_column
+    - save_min_max_scaler
     - normlize_columns
 - transform: A function to transform the data using all the 3 parts except for the grade column which is handled separately elsewhere
 """
@@ -48,8 +91,7 @@ def add_features(df: pd.DataFrame, states_dict_path: str) -> pd.DataFrame:
 
     df["installment_per_month"] = P * r * (1 + r) ** n / ((1 + r) ** n - 1)
 
-    with open(states_dict_path, "rb") as f:
-        states_dict = json.load(f)
+    states_dict = registry.load_json(states_dict_path)
 
     df["state_name"] = df["state"].map(states_dict)
     return df
@@ -59,54 +101,50 @@ def add_features(df: pd.DataFrame, states_dict_path: str) -> pd.DataFrame:
 
 
 def add_one_hot_encoding(
-    df: pd.DataFrame, column: str
+    df: pd.DataFrame, column: str, compact: bool = False
 ) -> Tuple[pd.DataFrame, List[str]]:
     """A function to add one-hot encoding to a column in a DataFrame
     Args:
         df: A pandas DataFrame
         column: A string
+        compact: A boolean to emit the one-hot columns as uint8 instead of int
     Returns:
         A pandas DataFrame, List[str]
     """
-    encoding_file = f"data/encodings/{column}_enc.json"
-    df[column] = df[column].astype(str).str.lower().str.replace(" ", "_")
+    encoding_file = f"{ENCODINGS_DIR}/{column}_enc.json"
+    codes, uniques = factorize_normalized(df[column])
     try:
-        with open(encoding_file, "r") as f:
-            old_values = json.load(f)[column]
+        encoder = registry.load(encoding_file, read_one_hot_encoder)
     except FileNotFoundError:
-        old_values = df[column].unique()
-        with open(encoding_file, "w") as f:
-            json.dump({column: old_values.tolist()}, f)
+        old_values = pd.unique(uniques[codes]).tolist()
+        registry.save_json(encoding_file, {column: old_values})
+        encoder = OneHotEncoder(column, old_values)
 
-    dummies = pd.get_dummies(df[column], prefix=column)
-    dummies = dummies.astype(int)
-
-    for value in old_values:
-        if column + "_" + value not in dummies.columns:
-            dummies[column + "_" + value] = 0
-    old_values = [column + "_" + value for value in old_values]
-    dummies = dummies[old_values]
+    df[column] = uniques[codes]
+    dummies = encoder.encode(codes, uniques, df.index, np.uint8 if compact else int)
 
     df = pd.concat([df, dummies], axis=1)
-    return df, old_values
+    return df, encoder.columns
 
 
 def add_label_encoding(
-    df: pd.DataFrame, column: str
+    df: pd.DataFrame, column: str, compact: bool = False
 ) -> Tuple[pd.DataFrame, List[str], List[int]]:
     """A function to add label encoding to a column in a DataFrame
     Args:
         df: A pandas DataFrame
         column: A string
+        compact: A boolean to downcast the codes to the smallest integer type
     Returns:
         A pandas DataFrame, List[str], List[int]
     """
-    encoding_file = f"data/encodings/{column}_enc.json"
+    encoding_file = f"{ENCODINGS_DIR}/{column}_enc.json"
 
     if os.path.exists(encoding_file):
-        with open(encoding_file, "r") as f:
-            encoding_dict = json.load(f)
+        encoding_dict = registry.load_json(encoding_file)
         df[column + "_enc"] = df[column].astype(str).map(encoding_dict)
+        if compact:
+            df[column + "_enc"] = pd.to_numeric(df[column + "_enc"], downcast="integer")
         return df, [], []
     else:
         unique_sorted = sorted(df[column].unique())
@@ -117,88 +155,64 @@ def add_label_encoding(
         ).codes
         new_values = sorted(df[column + "_enc"].unique())
 
-        with open(encoding_file, "w") as f:
-            encoding_dict = {
-                str(key): int(value) for key, value in zip(unique_sorted, new_values)
-            }
-            json.dump(encoding_dict, f)
+        encoding_dict = {
+            str(key): int(value) for key, value in zip(unique_sorted, new_values)
+        }
+        registry.save_json(encoding_file, encoding_dict)
 
         return df, old_values, new_values
 
 
 def update_lookup_table_one_hot(
-    lookup_df: pd.DataFrame, column: str, old_values: List[str]
-) -> pd.DataFrame:
+    lookup: LookupTable, column: str, old_values: List[str]
+) -> None:
     """A function to update the lookup table with one-hot encoding
     Args:
-        lookup_df: A pandas DataFrame
+        lookup: The lookup table to add the entries to
         column: A string
-    Returns:
-        A pandas DataFrame
+        old_values: The encoded values
     """
     for old in old_values:
-        new_row = pd.DataFrame(
-            [
-                {
-                    "column": column,
-                    "original": old,
-                    "imputed": {old},
-                    "impute_type": "one-hot-encoding",
-                }
-            ]
-        )
-        lookup_df = pd.concat([lookup_df, new_row], ignore_index=True)
-    return lookup_df
+        lookup.add(column, old, {old}, "one-hot-encoding")
 
 
 def update_lookup_table_label(
-    lookup_df: pd.DataFrame, column: str, old_values: List[str], new_values: List[int]
-) -> pd.DataFrame:
+    lookup: LookupTable, column: str, old_values: List[str], new_values: List[int]
+) -> None:
     """A function to update the lookup table with label encoding
     Args:
-        lookup_df: A pandas DataFrame
+        lookup: The lookup table to add the entries to
         column: A string
-    Returns:
-        A pandas DataFrame
+        old_values: The encoded values
+        new_values: Their labels
     """
     for old, new in zip(old_values, new_values):
-        new_row = pd.DataFrame(
-            [
-                {
-                    "column": column,
-                    "original": old,
-                    "imputed": new,
-                    "impute_type": "label-encoding",
-                }
-            ]
-        )
-        lookup_df = pd.concat([lookup_df, new_row], ignore_index=True)
-    return lookup_df
+        lookup.add(column, old, new, "label-encoding")
 
 
 def encode_and_update(
     df: pd.DataFrame,
     column: str,
-    lookup_df: pd.DataFrame,
+    lookup: LookupTable = None,
     encoding_type_threshold: int = 5,
     encode_type: str = None,
-) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    compact: bool = False,
+) -> pd.DataFrame:
     """A function to encode a column and update the lookup table based on the encoding type threshold
         Specify the encoding type if you want to force a specific encoding type
     Args:
         df: A pandas DataFrame
         column: A string
-        lookup_df: A pandas DataFrame
+        lookup: The lookup table to add the entries to, skipped if None
         encoding_type_threshold: An integer
         encode_type: A string
+        compact: A boolean to emit the codes with compact dtypes
     Returns:
-        A pandas DataFrame,
-        A pandas DataFrame,
+        A pandas DataFrame
     """
-    encoding_file = f"data/encodings/{column}_enc.json"
+    encoding_file = f"{ENCODINGS_DIR}/{column}_enc.json"
     if os.path.exists(encoding_file):
-        with open(encoding_file, "r") as f:
-            encoding_dict = json.load(f)
+        encoding_dict = registry.load_json(encoding_file)
         num_unique = len(encoding_dict)
     else :
         num_unique = df[column].nunique()
@@ -206,97 +220,124 @@ def encode_and_update(
          num_unique< encoding_type_threshold
         and encode_type != "label-encoding"
     ):
-        df, old_values = add_one_hot_encoding(df, column)
-        lookup_df = update_lookup_table_one_hot(lookup_df, column, old_values)
+        df, old_values = add_one_hot_encoding(df, column, compact)
+        if lookup is not None:
+            update_lookup_table_one_hot(lookup, column, old_values)
     else:
-        df, old_values, new_values = add_label_encoding(df, column)
-        lookup_df = update_lookup_table_label(lookup_df, column, old_values, new_values)
-    return df, lookup_df
+        df, old_values, new_values = add_label_encoding(df, column, compact)
+        if lookup is not None:
+            update_lookup_table_label(lookup, column, old_values, new_values)
+    return df
 
 
 def encode_columns(
-    df: pd.DataFrame, lookup_df: pd.DataFrame, encoding_type_threshold: int = 5
-) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    df: pd.DataFrame,
+    lookup: LookupTable = None,
+    encoding_type_threshold: int = 5,
+    compact: bool = False,
+) -> pd.DataFrame:
     """A function to encode columns in a DataFrame
     Args:
         df: A pandas DataFrame
-        lookup_df: A pandas DataFrame
+        lookup: The lookup table to add the entries to, skipped if None
         encoding_type_threshold: An integer
+        compact: A boolean to emit the codes with compact dtypes
     Returns:
-        A pandas DataFrame,
         A pandas DataFrame
     """
-    categorical_columns = {
-        "home_ownership": "any",
-        "verification_status": "any",
-        "purpose": "any",
-        "grade": "label-encoding",
-        "loan_status": "any",
-        "type": "any",
-        "state": "any",
-        "addr_state": "any",
-        "pymnt_plan": "label-encoding",
-    }
-
-    for column, encode_type in categorical_columns.items():
-        df, lookup_df = encode_and_update(
-            df, column, lookup_df, encode_type=encode_type
+    for column, encode_type in CATEGORICAL_COLUMNS.items():
+        df = encode_and_update(
+            df, column, lookup, encode_type=encode_type, compact=compact
         )
-    return df, lookup_df
+    return df
 
 
-def transform_grade(
-    df: pd.DataFrame, lookup_df: pd.DataFrame, update_lookup: bool = False
-) -> Tuple[pd.DataFrame, pd.DataFrame]:
+def transform_grade(df: pd.DataFrame, lookup: LookupTable = None) -> pd.DataFrame:
     """A function to handle the grade column
     Args:
         df: A pandas DataFrame
-        lookup_df: A pandas DataFrame
-        update_lookup: A boolean to update the lookup table
+        lookup: The lookup table to add the entries to, skipped if None
     Returns:
-        A tuple of 2 pandas DataFrames
+        A pandas DataFrame
     """
 
-    def map_grade(value):
-        grade_map = {5: "A", 10: "B", 15: "C", 20: "D", 25: "E", 30: "F", 35: "G"}
-        for threshold, grade in grade_map.items():
-            if value <= threshold:
-                return grade
-        return None
-
-    df["grade"] = df["grade"].apply(map_grade)
-
-    grade_map = {
-        "1-5": "A",
-        "6-10": "B",
-        "11-15": "C",
-        "16-20": "D",
-        "21-25": "E",
-        "26-30": "F",
-        "31-35": "G",
-    }
-    for threshold, grade in grade_map.items():
-        new_row = pd.DataFrame(
-            [
-                {
-                    "column": "grade",
-                    "original": threshold,
-                    "imputed": grade,
-                    "impute_type": "encoding",
-                }
-            ]
-        )
-        lookup_df = pd.concat([lookup_df, new_row], ignore_index=True)
+    # Every grade up to an upper edge takes the letter of that bin, grades above the last bin (or NaN) get None
+    bins = np.searchsorted(GRADE_UPPER_EDGES, df["grade"].to_numpy(dtype=float), side="left")
+    df["grade"] = pd.Series(GRADE_LETTERS[bins], index=df.index)
 
-    if not update_lookup:
-        return df
+    if lookup is not None:
+        for low, high, letter in GRADE_BINS:
+            lookup.add("grade", f"{low}-{high}", letter, "encoding")
 
-    return df, lookup_df
+    return df
 
 
 # ---------------- Part 3 ----------------
 
 
+def scaler_coefficients_path(scaler_file: str) -> str:
+    """A function to get the path of the coefficients exported next to a pickled scaler
+    Args:
+        scaler_file: A string representing the path to the pickled scaler
+    Returns:
+        A string representing the path to the JSON coefficients
+    """
+    return os.path.splitext(scaler_file)[0] + "_coef.json"
+
+
+def export_scaler_coefficients(scaler, scaler_file: str) -> dict:
+    """A function to export the scale and offset of a fitted scaler to a JSON file,
+    together with the signature of its pickle
+    Args:
+        scaler: A fitted sklearn MinMaxScaler of one column
+        scaler_file: A string representing the path to the pickled scaler
+    Returns:
+        A dictionary with the scale and min of the scaler
+    """
+    coefficients = {
+        "scale": float(scaler.scale_[0]),
+        "min": float(scaler.min_[0]),
+        "scaler_signature": file_signature(scaler_file),
+    }
+    registry.save_json(scaler_coefficients_path(scaler_file), coefficients, indent=4)
+    return coefficients
+
+
+def load_scaler_coefficients(scaler_file: str) -> dict:
+    """A function to load the coefficients of a scaler, from the exported JSON file
+    if it was exported from the current pickled scaler, else from the pickle, exporting them
+    Args:
+        scaler_file: A string representing the path to the pickled scaler
+    Returns:
+        A dictionary with the scale and min of the scaler
+    Raises:
+        FileNotFoundError: if the scaler does not exist
+    """
+    signature = file_signature(scaler_file)
+    try:
+        coefficients = registry.load_json(scaler_coefficients_path(scaler_file))
+        if coefficients.get("scaler_signature") == signature:
+            return coefficients
+    except FileNotFoundError:
+        pass
+    return export_scaler_coefficients(registry.load_pickle(scaler_file), scaler_file)
+
+
+def min_max_transform(values: pd.Series, coefficients: dict) -> np.ndarray:
+    """A function to scale a column with the operations of MinMaxScaler.transform, without sklearn
+    Args:
+        values: A pandas Series
+        coefficients: The coefficients of the scaler, see load_scaler_coefficients
+    Returns:
+        A numpy array of the scaled values
+    """
+    dtype = values.dtype if values.dtype.kind == "f" else np.float64
+    scaled = values.to_numpy(dtype=dtype, copy=True)
+    scaled *= np.array([coefficients["scale"]])
+    scaled += np.array([coefficients["min"]])
+    return scaled
+
+
 def min_max_scale_column(
     df: pd.DataFrame, old_column: str, new_column: str
 ) -> pd.DataFrame:
@@ -308,18 +349,36 @@ def min_max_scale_column(
         A pandas DataFrame
     """
 
-    if os.path.exists(f"data/scalers/{old_column}_scaler.pkl"):
-        with open(f"data/scalers/{old_column}_scaler.pkl", "rb") as f:
-            scaler = pkl.load(f)
-        df[new_column] = scaler.transform(df[[old_column]])
+    scaler_file = f"{SCALERS_DIR}/{old_column}_scaler.pkl"
+    if os.path.exists(scaler_file):
+        df[new_column] = min_max_transform(df[old_column], load_scaler_coefficients(scaler_file))
     else:
+        from sklearn.preprocessing import MinMaxScaler
+
         scaler = MinMaxScaler()
         df[new_column] = scaler.fit_transform(df[[old_column]])
-        with open(f"data/scalers/{old_column}_scaler.pkl", "wb") as f:
-            pkl.dump(scaler, f)
+        registry.save_pickle(scaler_file, scaler)
+        export_scaler_coefficients(scaler, scaler_file)
     return df
 
 
+def save_min_max_scaler(column: str, minimum: float, maximum: float) -> None:
+    """A function to save the scaler of a column from its minimum and maximum,
+    for columns whose range is computed without holding the whole column in memory
+    Args:
+        column: A string
+        minimum: The minimum of the column
+        maximum: The maximum of the column
+    """
+    from sklearn.preprocessing import MinMaxScaler
+
+    scaler = MinMaxScaler()
+    scaler.fit(pd.DataFrame({column: [minimum, maximum]}))
+    scaler_file = f"{SCALERS_DIR}/{column}_scaler.pkl"
+    registry.save_pickle(scaler_file, scaler)
+    export_scaler_coefficients(scaler, scaler_file)
+
+
 def normlize_columns(df: pd.DataFrame) -> pd.DataFrame:
     """A function to normalize columns in a DataFrame using min-max scaling
     Args:
@@ -327,12 +386,8 @@ def normlize_columns(df: pd.DataFrame) -> pd.DataFrame:
     Returns:
         A pandas DataFrame
     """
-    df = min_max_scale_column(df, "int_rate_outliers_capped", "int_rate_normalized")
-    df = min_max_scale_column(df, "loan_amount_sqrt", "loan_amount_sqrt_normalized")
-    df = min_max_scale_column(df, "funded_amount_sqrt", "funded_amount_sqrt_normalized")
-    df = min_max_scale_column(
-        df, "installment_per_month", "installment_per_month_normalized"
-    )
+    for old_column, new_column in SCALED_COLUMNS.items():
+        df = min_max_scale_column(df, old_column, new_column)
     return df
 
 
@@ -341,23 +396,20 @@ def normlize_columns(df: pd.DataFrame) -> pd.DataFrame:
 
 def transform(
     df: pd.DataFrame,
-    lookup_df: pd.DataFrame,
     states_dict_path: str,
-    update_lookup: bool = False,
-) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    lookup: LookupTable = None,
+    compact: bool = False,
+) -> pd.DataFrame:
     """A function to transform the data
     Args:
         df: A pandas DataFrame
-        lookup_df: A pandas DataFrame
         states_dict_path: A string representing the path to the states dictionary
-        update_lookup: A boolean to update the lookup table
+        lookup: The lookup table to add the entries to, skipped if None
+        compact: A boolean to emit the one-hot and label codes with compact dtypes
     Returns:
-        A tuple of 2 pandas DataFrames
+        A pandas DataFrame
     """
     df = add_features(df, states_dict_path)
-    df, lookup_df = encode_columns(df, lookup_df)
+    df = encode_columns(df, lookup, compact=compact)
     df = normlize_columns(df)
-
-    if not update_lookup:
-        return df
-    return df, lookup_df
+    return df
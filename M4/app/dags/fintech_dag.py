@@ -2,7 +2,7 @@ import sys
 
 sys.path.append('/opt/airflow/src')
 
-from functions import extract_clean, transform
+from functions import extract_clean, transform, land_raw_partitions
 from db import load_to_db
 
 
@@ -13,8 +13,12 @@ from airflow.operators.bash import BashOperator
 
 
 DATASET_PATH = "/opt/airflow/data/fintech_data_17_52_4509.csv"
-CLEANED_INTERMEDIATE_DATA_PATH = "/opt/airflow/data/fintech_clean.csv"
-TRANSFORMED_DATA_PATH = "/opt/airflow/data/fintech_transformed.csv"
+CLEANED_INTERMEDIATE_DATA_PATH = "/opt/airflow/data/fintech_clean.parquet"
+TRANSFORMED_DATA_PATH = "/opt/airflow/data/fintech_transformed.parquet"
+# Memory-mapped by the dashboard workers when DASHBOARD_DATA_SOURCE=arrow
+TRANSFORMED_ARROW_PATH = "/opt/airflow/data/fintech_transformed.arrow"
+# Read by fintech_incremental_pipeline, one directory per issue month
+RAW_PARTITIONS_DIR = "/opt/airflow/data/raw_partitions"
 
 # Define the DAG
 default_args = {
@@ -51,7 +55,8 @@ with DAG(
         python_callable = transform,
         op_kwargs = {
             'intermediate_data_path': CLEANED_INTERMEDIATE_DATA_PATH,
-            'transformed_data_path': TRANSFORMED_DATA_PATH
+            'transformed_data_path': TRANSFORMED_DATA_PATH,
+            'arrow_data_path': TRANSFORMED_ARROW_PATH
         }
     )
 
@@ -63,6 +68,16 @@ with DAG(
         }
     )
 
+    # Split the raw file by issue month for the incremental pipeline, alongside the full pipeline
+    land_raw_partitions_task = PythonOperator(
+        task_id = 'land_raw_partitions',
+        python_callable = land_raw_partitions,
+        op_kwargs = {
+            'data_path': DATASET_PATH,
+            'raw_partitions_dir': RAW_PARTITIONS_DIR
+        }
+    )
+
     # Define the task to run the Dash app
     run_dashboard = BashOperator(
         task_id='run_dashboard',
@@ -71,3 +86,4 @@ with DAG(
 
     # Define the task dependencies
     extract_clean_task >> transform_task >> load_to_db_task >> run_dashboard
+    land_raw_partitions_task >> run_dashboard
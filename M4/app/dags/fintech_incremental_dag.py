@@ -0,0 +1,68 @@
+import sys
+
+sys.path.append('/opt/airflow/src')
+
+from functions import extract_clean_partition, transform_partition
+from db import load_partition_to_db
+
+
+from airflow import DAG
+from airflow.utils.dates import days_ago
+from airflow.operators.python import PythonOperator
+
+
+# The issue month partitions, like issue_month=2016-01, new raw files land in RAW_PARTITIONS_DIR
+RAW_PARTITIONS_DIR = "/opt/airflow/data/raw_partitions"
+CLEANED_PARTITIONS_DIR = "/opt/airflow/data/fintech_clean"
+TRANSFORMED_PARTITIONS_DIR = "/opt/airflow/data/fintech_transformed"
+# Each run processes the issue month of its data interval
+ISSUE_MONTH = "{{ data_interval_start.strftime('%Y-%m') }}"
+
+# Define the DAG
+default_args = {
+    "owner": "Omar_Ahmed",
+    "depends_on_past": False,
+    'start_date': days_ago(2),
+    "retries": 1,
+}
+
+with DAG(
+    dag_id = 'fintech_incremental_pipeline',
+    schedule_interval = '@monthly', # past months can be processed with airflow dags backfill
+    default_args = default_args,
+    catchup = False,
+    max_active_runs = 1, # the runs update the same dashboard aggregates
+    tags = ['fintech-pipeline'],
+)as dag:
+    # Define the tasks, they reuse the artifacts fitted by fintech_pipeline
+    extract_clean_task = PythonOperator(
+        task_id = 'extract_clean_partition',
+        python_callable = extract_clean_partition,
+        op_kwargs = {
+            'raw_partitions_dir': RAW_PARTITIONS_DIR,
+            'cleaned_partitions_dir': CLEANED_PARTITIONS_DIR,
+            'issue_month': ISSUE_MONTH
+        }
+    )
+
+    transform_task = PythonOperator(
+        task_id = 'transform_partition',
+        python_callable = transform_partition,
+        op_kwargs = {
+            'cleaned_partitions_dir': CLEANED_PARTITIONS_DIR,
+            'transformed_partitions_dir': TRANSFORMED_PARTITIONS_DIR,
+            'issue_month': ISSUE_MONTH
+        }
+    )
+
+    load_to_db_task = PythonOperator(
+        task_id = 'load_partition_to_db',
+        python_callable = load_partition_to_db,
+        op_kwargs = {
+            'transformed_partitions_dir': TRANSFORMED_PARTITIONS_DIR,
+            'issue_month': ISSUE_MONTH
+        }
+    )
+
+    # Define the task dependencies
+    extract_clean_task >> transform_task >> load_to_db_task
@@ -0,0 +1,167 @@
+import json
+import os
+import pickle as pkl
+from typing import Any, Callable, Dict, Iterable, Tuple
+
+"""
+A module for caching the fitted artifacts of the cleaning pipeline which includes the following:
+- read_json
+- read_pickle
+- file_signature : A function to get the modification time and size of a file
+- ArtifactRegistry : A class that loads fitted artifacts once and reloads them only when their files change
+- registry : The registry shared by the handling_* and transformation modules
+"""
+
+
+def read_json(path: str) -> Any:
+    """A function to read a JSON file
+    Args:
+        path: A string representing the path to the file
+    Returns:
+        The parsed JSON content
+    """
+    with open(path, "r") as f:
+        return json.load(f)
+
+
+def read_pickle(path: str) -> Any:
+    """A function to read a pickle file
+    Args:
+        path: A string representing the path to the file
+    Returns:
+        The unpickled object
+    """
+    with open(path, "rb") as f:
+        return pkl.load(f)
+
+
+def file_signature(path: str) -> list:
+    """A function to get the signature an exported artifact records of the file it was exported from
+    Args:
+        path: A string representing the path to the file
+    Returns:
+        A list of the modification time and size of the file
+    Raises:
+        FileNotFoundError: if the file does not exist
+    """
+    stat = os.stat(path)
+    return [stat.st_mtime_ns, stat.st_size]
+
+
+class ArtifactRegistry:
+    """A class to hold the fitted artifacts (caps, means, encodings, scalers, models) in memory
+
+    Every artifact is cached together with the modification time and size of its file,
+    so an artifact is only read again from disk when its file changes.
+    The cached objects are shared, callers must not mutate them without saving them back.
+    """
+
+    def __init__(self) -> None:
+        self._cache: Dict[Tuple[str, Callable], Tuple[Tuple[int, int], Any]] = {}
+
+    @staticmethod
+    def _signature(path: str) -> Tuple[int, int]:
+        stat = os.stat(path)
+        return stat.st_mtime_ns, stat.st_size
+
+    def load(self, path: str, reader: Callable[[str], Any]) -> Any:
+        """A function to load an artifact using the cache
+        Args:
+            path: A string representing the path to the artifact
+            reader: A function that reads the artifact from the path
+        Returns:
+            The artifact
+        Raises:
+            FileNotFoundError: if the artifact does not exist
+        """
+        key = (path, reader)
+        signature = self._signature(path)
+        cached = self._cache.get(key)
+        if cached is not None and cached[0] == signature:
+            return cached[1]
+
+        value = reader(path)
+        self._cache[key] = (signature, value)
+        return value
+
+    def load_json(self, path: str) -> Any:
+        """A function to load a JSON artifact using the cache"""
+        return self.load(path, read_json)
+
+    def load_pickle(self, path: str) -> Any:
+        """A function to load a pickled artifact using the cache"""
+        return self.load(path, read_pickle)
+
+    def save_json(self, path: str, value: Any, **kwargs) -> None:
+        """A function to save a JSON artifact and cache it
+        Args:
+            path: A string representing the path to the artifact
+            value: The object to save
+            kwargs: Extra arguments passed to json.dump
+        """
+        with open(path, "w") as f:
+            json.dump(value, f, **kwargs)
+        self.invalidate(path)
+        self._cache[(path, read_json)] = (self._signature(path), value)
+
+    def save_pickle(self, path: str, value: Any) -> None:
+        """A function to save a pickled artifact and cache it
+        Args:
+            path: A string representing the path to the artifact
+            value: The object to save
+        """
+        with open(path, "wb") as f:
+            pkl.dump(value, f)
+        self.invalidate(path)
+        self._cache[(path, read_pickle)] = (self._signature(path), value)
+
+    def invalidate(self, path: str = None) -> None:
+        """A function to drop cached artifacts
+        Args:
+            path: A string representing the path to drop, all artifacts are dropped if None
+        """
+        if path is None:
+            self._cache.clear()
+            return
+        for key in [key for key in self._cache if key[0] == path]:
+            del self._cache[key]
+
+    def preload(self, json_paths: Iterable[str] = (), pickle_paths: Iterable[str] = ()) -> None:
+        """A function to load artifacts ahead of time, missing files are skipped
+        Args:
+            json_paths: Paths of JSON artifacts
+            pickle_paths: Paths of pickled artifacts
+        """
+        for path in json_paths:
+            if os.path.exists(path):
+                self.load_json(path)
+        for path in pickle_paths:
+            if os.path.exists(path):
+                self.load_pickle(path)
+
+    def preload_dirs(self, encodings_dir: str, scalers_dir: str) -> None:
+        """A function to preload every encoding and scaler found in their directories,
+        the scalers are preloaded from their exported coefficients so sklearn is not imported
+        Args:
+            encodings_dir: A string representing the directory of the *_enc.json files
+            scalers_dir: A string representing the directory of the *_scaler_coef.json files
+        """
+        if os.path.isdir(encodings_dir):
+            self.preload(
+                json_paths=[
+                    os.path.join(encodings_dir, name)
+                    for name in os.listdir(encodings_dir)
+                    if name.endswith("_enc.json")
+                ]
+            )
+        if os.path.isdir(scalers_dir):
+            self.preload(
+                json_paths=[
+                    os.path.join(scalers_dir, name)
+                    for name in os.listdir(scalers_dir)
+                    if name.endswith("_scaler_coef.json")
+                ]
+            )
+
+
+registry = ArtifactRegistry()
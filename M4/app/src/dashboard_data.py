@@ -0,0 +1,327 @@
+import math
+import os
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+from typing import Dict, List, Optional
+from sqlalchemy import case, column, func, select, table
+from db import CLEANED_DATA_DB_TABLE
+from aggregates import AGGREGATE_DB_TABLES, DATA_VERSION_DB_TABLE
+from large_data import stratum_quotas, stratified_sample
+from storage import read_arrow, read_summary_tables
+
+"""
+A module for the data read by the dashboard which includes the following:
+- DatabaseDataSource : A class querying the loans table and summary tables for each figure of the dashboard
+- ArrowDataSource : A class reading the memory-mapped Arrow file published by transform, with the same methods
+"""
+
+
+class DatabaseDataSource:
+    """A class querying the loans table written by load_to_db and the summary tables for each figure
+
+    Nothing is read when the source is created. Every figure runs its own query that selects
+    only the columns it needs, with the filters, aggregations and sampling done in SQL.
+    """
+
+    def __init__(self, con, loans_table: str = CLEANED_DATA_DB_TABLE) -> None:
+        self.con = con
+        self.loans_table = table(loans_table)
+        self.monthly_table = table(AGGREGATE_DB_TABLES["monthly_loan_counts"])
+        self.grade_table = table(AGGREGATE_DB_TABLES["grade_distribution"])
+        self.state_table = table(AGGREGATE_DB_TABLES["state_loan_amount"])
+        self.version_table = table(DATA_VERSION_DB_TABLE)
+
+    def _read(self, query) -> pd.DataFrame:
+        with self.con.connect() as connection:
+            return pd.read_sql(query, connection)
+
+    @staticmethod
+    def _filter_state(query, state: Optional[str]):
+        return query if state is None else query.where(column("state_name") == state)
+
+    def version(self) -> tuple:
+        """A function to get the version of the data, changes whenever loans are added or replaced,
+        read from the one row table saved with the summary tables so the loans are not scanned
+        Returns:
+            A tuple of the number of aggregated loans and the time the summary tables were saved
+        """
+        query = select(column("loan_count"), column("updated_at")).select_from(self.version_table)
+        with self.con.connect() as connection:
+            return tuple(connection.execute(query).one())
+
+    def loan_count(self, state: Optional[str] = None) -> int:
+        """A function to count the loans
+        Args:
+            state: The state_name to count the loans of, None for all states
+        Returns:
+            The number of loans
+        """
+        query = self._filter_state(select(func.count()).select_from(self.loans_table), state)
+        return int(self._read(query).iloc[0, 0])
+
+    def loans(self, columns: List[str], state: Optional[str] = None) -> pd.DataFrame:
+        """A function to read some columns of the loans
+        Args:
+            columns: The columns to read
+            state: The state_name to read the loans of, None for all states
+        Returns:
+            A pandas DataFrame with the columns
+        """
+        query = select(*[column(name) for name in columns]).select_from(self.loans_table)
+        return self._read(self._filter_state(query, state))
+
+    def sample_loans(
+        self, columns: List[str], stratify_by: str, budget: int, state: Optional[str] = None
+    ) -> tuple:
+        """A function to read some columns of about budget loans, stratified by a column
+        Every group gets its share of the budget (see stratum_quotas) and its loans are taken
+        at an even step in loan_id order, so the sample is deterministic for the same data.
+        Loans without a stratify_by value belong to no group and are left out.
+        Args:
+            columns: The columns to read
+            stratify_by: The column to stratify by
+            budget: The number of loans to read
+            state: The state_name to read the loans of, None for all states
+        Returns:
+            A tuple of a pandas DataFrame with the columns and the number of loans it was drawn from
+        """
+        stratified = column(stratify_by).is_not(None)
+        counts_query = self._filter_state(
+            select(column(stratify_by), func.count().label("count"))
+            .select_from(self.loans_table)
+            .where(stratified)
+            .group_by(column(stratify_by)),
+            state,
+        )
+        counts = self._read(counts_query).set_index(stratify_by)["count"]
+        total = int(counts.sum())
+        if total <= budget:
+            query = select(*[column(name) for name in columns]).select_from(self.loans_table)
+            return self._read(self._filter_state(query.where(stratified), state)), total
+
+        steps = {
+            value: math.ceil(count / quota)
+            for value, count, quota in zip(counts.index, counts, stratum_quotas(counts, budget))
+        }
+        selected = columns if stratify_by in columns else columns + [stratify_by]
+        numbered = self._filter_state(
+            select(
+                *[column(name) for name in selected],
+                func.row_number()
+                .over(partition_by=column(stratify_by), order_by=column("loan_id"))
+                .label("row_number"),
+            ).select_from(self.loans_table).where(stratified),
+            state,
+        ).subquery()
+        step = case(steps, value=numbered.c[stratify_by])
+        query = select(*[numbered.c[name] for name in columns]).where(
+            (numbered.c.row_number - 1) % step == 0
+        )
+        return self._read(query), total
+
+    def grade_loan_amount_summary(self) -> pd.DataFrame:
+        """A function to summarize the normalized loan amount of every grade with the statistics
+        of a box plot, see quantile_summary. The quantiles and whiskers are computed in SQL,
+        only one row per grade is read.
+        Returns:
+            A pandas DataFrame indexed by grade with the q1, median, q3, mean, lowerfence and upperfence columns
+        """
+        loans = table(self.loans_table.name, column("grade"), column("loan_amount_sqrt_normalized"))
+        amount = loans.c.loan_amount_sqrt_normalized
+        quartiles = (
+            select(
+                loans.c.grade,
+                func.percentile_cont(0.25).within_group(amount).label("q1"),
+                func.percentile_cont(0.5).within_group(amount).label("median"),
+                func.percentile_cont(0.75).within_group(amount).label("q3"),
+                func.avg(amount).label("mean"),
+            )
+            .where(loans.c.grade.is_not(None))
+            .group_by(loans.c.grade)
+            .subquery()
+        )
+        iqr = quartiles.c.q3 - quartiles.c.q1
+        query = (
+            select(
+                *quartiles.c,
+                func.min(amount).filter(amount >= quartiles.c.q1 - 1.5 * iqr).label("lowerfence"),
+                func.max(amount).filter(amount <= quartiles.c.q3 + 1.5 * iqr).label("upperfence"),
+            )
+            .select_from(loans.join(quartiles, loans.c.grade == quartiles.c.grade))
+            .group_by(*quartiles.c)
+        )
+        return self._read(query).set_index("grade")
+
+    def years(self) -> List[int]:
+        """A function to get the years loans were issued in
+        Returns:
+            A sorted list of the years
+        """
+        query = select(column("year")).select_from(self.monthly_table).distinct().order_by(column("year"))
+        return self._read(query)["year"].tolist()
+
+    def monthly_loan_counts(self, year: int) -> pd.DataFrame:
+        """A function to get the number of loans issued per month of a year
+        Args:
+            year: The year
+        Returns:
+            A pandas DataFrame with the month and loan_count columns, in month order
+        """
+        query = (
+            select(column("month"), column("loan_count"))
+            .select_from(self.monthly_table)
+            .where(column("year") == year)
+            .order_by(column("month_number"))
+        )
+        return self._read(query)
+
+    def grade_distribution(self) -> pd.DataFrame:
+        """A function to get the percentage of loans of each grade
+        Returns:
+            A pandas DataFrame with the grade and percentage columns, in grade order
+        """
+        query = (
+            select(column("grade"), column("percentage"))
+            .select_from(self.grade_table)
+            .order_by(column("grade"))
+        )
+        return self._read(query)
+
+    def state_loan_amounts(self) -> pd.DataFrame:
+        """A function to get the average loan amount of each state
+        Returns:
+            A pandas DataFrame with the state, state_name and loan_amount_mean columns,
+            from the highest to the lowest average
+        """
+        query = (
+            select(column("state"), column("state_name"), column("loan_amount_mean"))
+            .select_from(self.state_table)
+            .order_by(column("loan_amount_mean").desc())
+        )
+        return self._read(query)
+
+
+class ArrowDataSource:
+    """A class reading the Arrow file published by transform, with the methods of DatabaseDataSource
+
+    The file is memory-mapped, so opening it parses nothing and every dashboard worker
+    shares the same pages. Only the columns and rows a figure needs are converted to pandas.
+    The summary tables are the ones transform published in the file, no loans are aggregated.
+    The file is mapped again when transform publishes a new one.
+    """
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self._version = None
+        self._table = None
+        self._summary_tables = None
+
+    def version(self) -> tuple:
+        """A function to get the version of the Arrow file, changes whenever transform publishes it again
+        Returns:
+            A tuple of the inode, size and modification time of the file
+        """
+        stat = os.stat(self.path)
+        return (stat.st_ino, stat.st_size, stat.st_mtime_ns)
+
+    @property
+    def table(self) -> pa.Table:
+        version = self.version()
+        if version != self._version:
+            self._table = read_arrow(self.path)
+            self._summary_tables = None
+            self._version = version
+        return self._table
+
+    def _filter_state(self, state: Optional[str]) -> pa.Table:
+        if state is None:
+            return self.table
+        return self.table.filter(pc.equal(self.table.column("state_name"), state))
+
+    def _summary(self) -> Dict[str, pd.DataFrame]:
+        table = self.table
+        if self._summary_tables is None:
+            self._summary_tables = read_summary_tables(table)
+        return self._summary_tables
+
+    def loan_count(self, state: Optional[str] = None) -> int:
+        """A function to count the loans
+        Args:
+            state: The state_name to count the loans of, None for all states
+        Returns:
+            The number of loans
+        """
+        return self._filter_state(state).num_rows
+
+    def loans(self, columns: List[str], state: Optional[str] = None) -> pd.DataFrame:
+        """A function to read some columns of the loans
+        Args:
+            columns: The columns to read
+            state: The state_name to read the loans of, None for all states
+        Returns:
+            A pandas DataFrame with the columns
+        """
+        return self._filter_state(state).select(columns).to_pandas()
+
+    def sample_loans(
+        self, columns: List[str], stratify_by: str, budget: int, state: Optional[str] = None
+    ) -> tuple:
+        """A function to read some columns of about budget loans, stratified by a column,
+        see stratified_sample. Loans without a stratify_by value belong to no group and are left out.
+        Args:
+            columns: The columns to read
+            stratify_by: The column to stratify by
+            budget: The number of loans to read
+            state: The state_name to read the loans of, None for all states
+        Returns:
+            A tuple of a pandas DataFrame with the columns and the number of loans it was drawn from
+        """
+        table = self._filter_state(state)
+        table = table.filter(pc.is_valid(table.column(stratify_by)))
+        if table.num_rows <= budget:
+            return table.select(columns).to_pandas(), table.num_rows
+        # Only the stratify column is converted to pick the rows
+        strata = table.column(stratify_by).to_pandas().to_frame()
+        rows = stratified_sample(strata, stratify_by, budget).index
+        return table.select(columns).take(pa.array(rows)).to_pandas(), table.num_rows
+
+    def grade_loan_amount_summary(self) -> pd.DataFrame:
+        """A function to summarize the normalized loan amount of every grade with the statistics
+        of a box plot, as published by transform
+        Returns:
+            A pandas DataFrame indexed by grade with the q1, median, q3, mean, lowerfence and upperfence columns
+        """
+        return self._summary()["grade_loan_amount_summary"].set_index("grade")
+
+    def years(self) -> List[int]:
+        """A function to get the years loans were issued in
+        Returns:
+            A sorted list of the years
+        """
+        return sorted(self._summary()["monthly_loan_counts"]["year"].unique().tolist())
+
+    def monthly_loan_counts(self, year: int) -> pd.DataFrame:
+        """A function to get the number of loans issued per month of a year
+        Args:
+            year: The year
+        Returns:
+            A pandas DataFrame with the month and loan_count columns, in month order
+        """
+        monthly = self._summary()["monthly_loan_counts"]
+        return monthly.loc[monthly["year"] == year, ["month", "loan_count"]].reset_index(drop=True)
+
+    def grade_distribution(self) -> pd.DataFrame:
+        """A function to get the percentage of loans of each grade
+        Returns:
+            A pandas DataFrame with the grade and percentage columns, in grade order
+        """
+        return self._summary()["grade_distribution"][["grade", "percentage"]].copy()
+
+    def state_loan_amounts(self) -> pd.DataFrame:
+        """A function to get the average loan amount of each state
+        Returns:
+            A pandas DataFrame with the state, state_name and loan_amount_mean columns,
+            from the highest to the lowest average
+        """
+        return self._summary()["state_loan_amount"][["state", "state_name", "loan_amount_mean"]].copy()
@@ -0,0 +1,88 @@
+import numpy as np
+import pandas as pd
+from typing import List
+from artifacts import read_json
+
+"""
+A module for encoding columns with their stored categories which includes the following:
+- normalize_category : A function to normalize a value the way the one-hot columns are named
+- factorize_normalized : A function to factorize a column into codes and normalized distinct values
+- OneHotEncoder : A one-hot encoder compiled once from the stored categories of a column
+- read_one_hot_encoder : A function to build a OneHotEncoder from a *_enc.json file, used with the artifact registry
+"""
+
+
+def normalize_category(value) -> str:
+    """A function to normalize a value the way the one-hot columns are named
+    Args:
+        value: A value of the column
+    Returns:
+        The value as a lower case string with underscores instead of spaces
+    """
+    return str(value).lower().replace(" ", "_")
+
+
+def factorize_normalized(values: pd.Series) -> tuple:
+    """A function to factorize a column and normalize every distinct value once
+    Args:
+        values: A pandas Series
+    Returns:
+        A tuple of the codes of the values and the normalized distinct values as an object array,
+        uniques[codes] gives the normalized column
+    """
+    codes, uniques = pd.factorize(values)
+    normalized = [normalize_category(value) for value in uniques]
+    # factorize merges None and NaN, while their string forms differ
+    missing = codes == -1
+    if missing.any():
+        missing_codes, missing_uniques = pd.factorize(values[missing].astype(str))
+        codes[missing] = missing_codes + len(normalized)
+        normalized += [normalize_category(value) for value in missing_uniques]
+    return codes, np.array(normalized, dtype=object)
+
+
+class OneHotEncoder:
+    """A one-hot encoder for one column compiled once from its stored categories
+
+    The output columns are known up front: one column per stored category, in the stored order.
+    A value that is not a stored category is encoded as a row of zeros.
+    """
+
+    def __init__(self, column: str, categories: List[str]) -> None:
+        self.column = column
+        self.categories = pd.Index(categories)
+        self.columns = [f"{column}_{category}" for category in categories]
+
+    def encode(
+        self,
+        codes: np.ndarray,
+        uniques: np.ndarray,
+        index: pd.Index,
+        dtype=np.uint8,
+    ) -> pd.DataFrame:
+        """A function to build the one-hot columns of a factorized column
+        Args:
+            codes: The codes returned by factorize_normalized
+            uniques: The normalized distinct values returned by factorize_normalized
+            index: The index of the output DataFrame
+            dtype: The dtype of the one-hot columns
+        Returns:
+            A pandas DataFrame with the encoder columns
+        """
+        # only the distinct values are looked up in the categories
+        category_codes = self.categories.get_indexer(uniques)[codes]
+        rows = np.flatnonzero(category_codes >= 0)
+        matrix = np.zeros((len(category_codes), len(self.columns)), dtype=dtype)
+        matrix[rows, category_codes[rows]] = 1
+        return pd.DataFrame(matrix, index=index, columns=self.columns)
+
+
+def read_one_hot_encoder(path: str) -> OneHotEncoder:
+    """A function to build a OneHotEncoder from a *_enc.json file holding {column: [categories]}
+    Args:
+        path: A string representing the path to the encoding file
+    Returns:
+        A OneHotEncoder
+    """
+    (column, categories), = read_json(path).items()
+    return OneHotEncoder(column, categories)
@@ -0,0 +1,63 @@
+from collections import OrderedDict
+from typing import Any, Callable, Hashable
+
+"""
+A module for reusing the figures built by the dashboard callbacks which includes the following:
+- FigureCache : A memory-bounded LRU cache of figures keyed by callback, input value and data version
+"""
+
+
+class FigureCache:
+    """A class to remember the most recently built callback figures
+
+    A figure is keyed by (callback, input value, data version), so a figure built from
+    older data is never returned once the data version changes.
+    At most capacity figures are kept, the least recently used ones are evicted first.
+    """
+
+    def __init__(self, capacity: int = 64, version: Hashable = None) -> None:
+        self.capacity = capacity
+        self.version = version
+        self._figures = OrderedDict()
+        self.lookups = 0
+        self.hits = 0
+
+    def __len__(self) -> int:
+        return len(self._figures)
+
+    def get_or_build(self, callback: str, value: Any, build: Callable[[Any], Any]) -> Any:
+        """A function to get the cached figure of a callback input or build and cache it
+        Args:
+            callback: The name of the callback
+            value: The input value of the callback
+            build: A function building the figure from the input value
+        Returns:
+            The figure
+        """
+        self.lookups += 1
+        key = (callback, value, self.version)
+        if key in self._figures:
+            self.hits += 1
+            self._figures.move_to_end(key)
+            return self._figures[key]
+
+        figure = build(value)
+        self._figures[key] = figure
+        if len(self._figures) > self.capacity:
+            self._figures.popitem(last=False)
+        return figure
+
+    def invalidate(self, version: Hashable) -> None:
+        """A function to drop every cached figure when the data is reloaded
+        Args:
+            version: The version of the reloaded data
+        """
+        self.version = version
+        self._figures.clear()
+
+    def stats(self) -> str:
+        """A function to describe the cache usage
+        Returns:
+            A string with the size, lookups and hits of the cache
+        """
+        return f"Figure cache: {len(self)} figures, {self.lookups} lookups, {self.hits} hits"
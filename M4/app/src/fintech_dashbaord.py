@@ -1,51 +1,109 @@
-from dash import Dash, html, dcc, callback, Output, Input
+import os
+import time
+from dash import Dash, html, dcc, callback, Output, Input, State, no_update
 import plotly.express as px
+import plotly.graph_objects as go
 import pandas as pd
+from db import engine
+from dashboard_data import DatabaseDataSource, ArrowDataSource
+from figure_cache import FigureCache
+
+FIGURE_CACHE_SIZE = 64
+# Above this many loans the per loan plots are downsampled or summarized and drawn with WebGL,
+# so the figures sent to the browser stay about the same size as the data grows
+POINT_BUDGET = 20_000
+# Seconds between two checks of the database for streamed loans
+DATA_POLL_SECONDS = 5
+# Seconds the data version is reused for, so a worker reads it once per period however many tabs poll
+DATA_VERSION_TTL = 5.0
+
+# "database" queries the database for the rows and columns each figure shows,
+# "arrow" memory-maps the Arrow file published by transform, shared by every dashboard worker
+DATA_SOURCE = os.environ.get("DASHBOARD_DATA_SOURCE", "database")
+TRANSFORMED_ARROW_PATH = os.environ.get(
+    "DASHBOARD_ARROW_PATH", "/opt/airflow/data/fintech_transformed.arrow")
+
+if DATA_SOURCE == "arrow":
+    data_source = ArrowDataSource(TRANSFORMED_ARROW_PATH)
+else:
+    data_source = DatabaseDataSource(engine)
+figure_cache = FigureCache(FIGURE_CACHE_SIZE, data_source.version())
+last_version_check = time.monotonic()
+
+
+def current_data_version() -> tuple:
+    """A function to get the version of the data, read at most once every DATA_VERSION_TTL seconds,
+    dropping the cached figures when it changed"""
+    global last_version_check
+    if time.monotonic() - last_version_check >= DATA_VERSION_TTL:
+        last_version_check = time.monotonic()
+        version = data_source.version()
+        if version != figure_cache.version:
+            figure_cache.invalidate(version)
+    return figure_cache.version
 
-# TRANSFORMED_DATA_PATH = '../data/fintech_transformed.csv' # For local testing
-TRANSFORMED_DATA_PATH = "/opt/airflow/data/fintech_transformed.csv"
-df = pd.read_csv(TRANSFORMED_DATA_PATH)
 
 # ------------------- Q1 -------------------
-sorted_grades = sorted(df['grade'].unique())
-fig = px.violin(
-    df,
-    x='grade',
-    y='loan_amount_sqrt_normalized',
-    title="Loan Amount Distribution by Letter Grades",
-    labels={'grade': 'Grade',
-            'loan_amount_sqrt_normalized': 'Loan Amount (normalized)'},
-    color='grade',
-    box=True,
-    points="all",
-    category_orders={'grade': sorted_grades}
-)
-fig.update_traces(meanline_visible=True)
+def build_loan_amount_distribution(_):
+    sorted_grades = data_source.grade_distribution()['grade'].tolist()
+    if data_source.loan_count() <= POINT_BUDGET:
+        fig = px.violin(
+            data_source.loans(['grade', 'loan_amount_sqrt_normalized']),
+            x='grade',
+            y='loan_amount_sqrt_normalized',
+            title="Loan Amount Distribution by Letter Grades",
+            labels={'grade': 'Grade',
+                    'loan_amount_sqrt_normalized': 'Loan Amount (normalized)'},
+            color='grade',
+            box=True,
+            points="all",
+            category_orders={'grade': sorted_grades}
+        )
+        fig.update_traces(meanline_visible=True)
+        return fig
+
+    # Too many loans to send each one, draw the boxes from quantiles computed by the data source instead
+    grade_summary = data_source.grade_loan_amount_summary().reindex(sorted_grades)
+    colors = px.colors.qualitative.Plotly
+    fig = go.Figure([
+        go.Box(
+            name=row.Index, x=[row.Index],
+            q1=[row.q1], median=[row.median], q3=[row.q3], mean=[row.mean],
+            lowerfence=[row.lowerfence], upperfence=[row.upperfence],
+            marker_color=colors[i % len(colors)]
+        )
+        for i, row in enumerate(grade_summary.itertuples())
+    ])
+    fig.update_layout(
+        title="Loan Amount Distribution by Letter Grades",
+        xaxis_title='Grade', yaxis_title='Loan Amount (normalized)',
+        legend_title_text='grade'
+    )
+    return fig
+
 
 # ------------------- Q3 -------------------
-df['issue_date'] = pd.to_datetime(df['issue_date'])
-df['year'] = df['issue_date'].dt.year
-df['month'] = df['issue_date'].dt.month_name()
-years = sorted(df['year'].unique())
+years = data_source.years()
+
 
 # ------------------- Q4 -------------------
-loan_amount_states = df.groupby(['state_name', 'state'])[
-    'loan_amount'].mean().sort_values(ascending=False)
-loan_amount_states = loan_amount_states.reset_index()
-loan_amount_states['loan_amount_mean'] = loan_amount_states['loan_amount'].round(
-    2)
-fig_map = px.choropleth(
-    data_frame=loan_amount_states,
-    locations='state',
-    locationmode='USA-states',
-    color='loan_amount_mean',
-    color_continuous_scale='Reds',
-    scope='usa',
-    title='Average Loan Amount by State',
-    labels={'loan_amount_mean': 'Average Loan Amount'},
-    hover_name='state_name',
-    hover_data={'state': False, 'loan_amount_mean': ':.0f'}
-)
+def build_state_map(_):
+    loan_amount_states = data_source.state_loan_amounts()
+    loan_amount_states['loan_amount_mean'] = loan_amount_states['loan_amount_mean'].round(
+        2)
+    fig_map = px.choropleth(
+        data_frame=loan_amount_states,
+        locations='state',
+        locationmode='USA-states',
+        color='loan_amount_mean',
+        color_continuous_scale='Reds',
+        scope='usa',
+        title='Average Loan Amount by State',
+        labels={'loan_amount_mean': 'Average Loan Amount'},
+        hover_name='state_name',
+        hover_data={'state': False, 'loan_amount_mean': ':.0f'}
+    )
+    return fig_map
 #  view the map with bar chart
 # fig_bar_avg = px.bar(
 #     loan_amount_states,
@@ -57,21 +115,28 @@ fig_map = px.choropleth(
 #     hover_data={'loan_amount_mean': ':.2f'},
 # )
 
+
 # ------------------- Q5 -------------------
-# Calculate the count and percentage distribution of loan grades
-loan_grade_dist = df['grade'].value_counts(
-    normalize=True) * 100
-loan_grade_dist_df = loan_grade_dist.reset_index()
-loan_grade_dist_df.columns = ['grade', 'Percentage']
-loan_grade_dist_df = loan_grade_dist_df.sort_values('grade')
-fig_bar = px.bar(
-    loan_grade_dist_df,
-    x='grade',
-    y='Percentage',
-    title="Percentage Distribution of Loan Grades",
-    labels={'grade': 'Loan Grade', 'Percentage': 'Percentage (%)'},
-    hover_data={'Percentage': ':.2f'},  # Show percentage with 2 decimal places
-)
+def build_grade_bar(_):
+    # The count and percentage distribution of loan grades
+    loan_grade_dist_df = data_source.grade_distribution()
+    loan_grade_dist_df.columns = ['grade', 'Percentage']
+    fig_bar = px.bar(
+        loan_grade_dist_df,
+        x='grade',
+        y='Percentage',
+        title="Percentage Distribution of Loan Grades",
+        labels={'grade': 'Loan Grade', 'Percentage': 'Percentage (%)'},
+        hover_data={'Percentage': ':.2f'},  # Show percentage with 2 decimal places
+    )
+    return fig_bar
+
+
+def state_options():
+    return [{'label': 'All', 'value': 'all'}] + [
+        {'label': state, 'value': state}
+        for state in sorted(data_source.state_loan_amounts()['state_name'])]
+
 
 # Initialize the app
 app = Dash(__name__)
@@ -79,6 +144,10 @@ app = Dash(__name__)
 # App Layout
 app.layout = html.Div([
 
+    # Polls the database and holds the version of the data the figures show
+    dcc.Interval(id='refresh-interval', interval=DATA_POLL_SECONDS * 1000),
+    dcc.Store(id='data-version', data=str(figure_cache.version)),
+
     # Header
     html.Div([
         html.H1("Fintech Data Dashboard", className="main-title"),
@@ -110,8 +179,7 @@ app.layout = html.Div([
             html.H3("What is the percentage distribution of loan grades in the dataset?",
                     className="card-title"),
             dcc.Graph(
-                id='loan-grade-bar',
-                figure=fig_bar
+                id='loan-grade-bar'
             ),
         ], className="card"),
     ], className="grid-container"),
@@ -121,7 +189,6 @@ app.layout = html.Div([
                 className="card-title"),
         dcc.Graph(
             id='q1-graph',
-            figure=fig,  # Directly add the figure here without using callbacks
             config={"displayModeBar": False}  # Simplify the display
         ),
     ], className="card"),
@@ -132,7 +199,6 @@ app.layout = html.Div([
                 className="card-title"),
         dcc.Graph(
             id='avg-loan-bar-chart',
-            figure=fig_map,
         ),
     ], className="card"),
     # Question 2: Loan Amount vs. Annual Income
@@ -142,8 +208,7 @@ app.layout = html.Div([
 
         # Dropdown for selecting states
         dcc.Dropdown(
-            options=[{'label': 'All', 'value': 'all'}] + [{'label': state,
-                                                           'value': state} for state in df['state_name'].unique()],
+            options=state_options(),
             value='all',  # Default to "All" option
             id='state-dropdown',
             placeholder="Select a state..."
@@ -175,20 +240,59 @@ app.layout = html.Div([
 ], className="main-container")
 
 
+# ------------------- Data version -------------------
+@callback(
+    Output('data-version', 'data'),
+    Input('refresh-interval', 'n_intervals'),
+    State('data-version', 'data')
+)
+def poll_data_version(_, current_version):
+    # Streamed loans change the version, which drops the cached figures and redraws them
+    version = current_data_version()
+    if str(version) == current_version:
+        return no_update
+    return str(version)
+
+
+@callback(
+    Output('q1-graph', 'figure'),
+    Output('avg-loan-bar-chart', 'figure'),
+    Output('loan-grade-bar', 'figure'),
+    Output('year-dropdown', 'options'),
+    Output('state-dropdown', 'options'),
+    Input('data-version', 'data')
+)
+def update_summary_figures(_):
+    return (
+        figure_cache.get_or_build('q1-graph', None, build_loan_amount_distribution),
+        figure_cache.get_or_build('avg-loan-bar-chart', None, build_state_map),
+        figure_cache.get_or_build('loan-grade-bar', None, build_grade_bar),
+        [{'label': str(year), 'value': year} for year in data_source.years()],
+        state_options(),
+    )
+
+
 # ------------------- Q2 -------------------
 @callback(
     Output('loan-income-scatter', 'figure'),
     Input('state-dropdown', 'value'),
+    Input('data-version', 'data')
 )
-def update_scatter(state):
-    # If 'all' is selected, don't filter the data
-    if state == 'all':
-        filtered_df = df
-    else:
-        filtered_df = df[df['state_name'] == state]
+def update_scatter(state, _):
+    return figure_cache.get_or_build('update_scatter', state, build_scatter)
 
-    # Ensure that 'loan_status_enc' is treated as categorical (string)
+
+def build_scatter(state):
+    # If 'all' is selected, don't filter the data
+    state_name = None if state == 'all' else state
+    # The loans are counted by the stratum counts of the sample, without another scan
+    filtered_df, loan_count = data_source.sample_loans(
+        ['loan_amount', 'annual_inc', 'loan_status', 'loan_status_enc'],
+        'loan_status', POINT_BUDGET, state_name)
+    downsampled = loan_count > POINT_BUDGET
+    # Ensure that 'loan_status' is treated as categorical (string)
     filtered_df['loan_status'] = filtered_df['loan_status'].astype(str)
+
     colors = ['blue', 'red', 'green', 'orange', 'purple', 'yellow']
     # Create the scatter plot
     fig = px.scatter(
@@ -200,7 +304,8 @@ def update_scatter(state):
         labels={'loan_amount': 'Loan Amount',
                 'annual_inc': 'Annual Income'},
         color_discrete_map={
-            str(i): colors[i] for i in filtered_df['loan_status_enc'].unique()}
+            str(i): colors[i] for i in filtered_df['loan_status_enc'].unique()},
+        render_mode='webgl' if downsampled else 'auto'
     )
     return fig
 
@@ -209,14 +314,16 @@ def update_scatter(state):
 
 @callback(
     Output('loan-issuance-trend', 'figure'),
-    Input('year-dropdown', 'value')
+    Input('year-dropdown', 'value'),
+    Input('data-version', 'data')
 )
-def update_line_plot(selected_year):
-    filtered_df = df[df['year'] == selected_year]
+def update_line_plot(selected_year, _):
+    return figure_cache.get_or_build('update_line_plot', selected_year, build_line_plot)
+
 
-    # Group by month and count the number of loans issued
-    loan_count_per_month = filtered_df.groupby(
-        'month').size().reset_index(name='loan_count')
+def build_line_plot(selected_year):
+    # The number of loans issued per month of the year
+    loan_count_per_month = data_source.monthly_loan_counts(selected_year)
 
     all_months = ['January', 'February', 'March', 'April', 'May', 'June',
                   'July', 'August', 'September', 'October', 'November', 'December']
@@ -242,5 +349,18 @@ def update_line_plot(selected_year):
     return fig
 
 
+def warm_figure_cache():
+    """A function to build the figures of the most common selections before the first request"""
+    figure_cache.get_or_build('q1-graph', None, build_loan_amount_distribution)
+    figure_cache.get_or_build('avg-loan-bar-chart', None, build_state_map)
+    figure_cache.get_or_build('loan-grade-bar', None, build_grade_bar)
+    figure_cache.get_or_build('update_scatter', 'all', build_scatter)
+    # The year dropdown starts on the first year, the latest year is the most viewed
+    for year in {years[0], years[-1]}:
+        figure_cache.get_or_build('update_line_plot', year, build_line_plot)
+    print(figure_cache.stats())
+
+
 if __name__ == '__main__':
-     app.run_server(debug=True, host='0.0.0.0', port=8050)
\ No newline at end of file
+    warm_figure_cache()
+    app.run_server(debug=True, host='0.0.0.0', port=8050)
\ No newline at end of file
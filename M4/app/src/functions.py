@@ -1,21 +1,47 @@
 import pandas as pd
 import os
+import glob
+import shutil
 from init_cleaning import init_cleaning
-from handling_outliers import handling_outliers, handling_int_rate_outliers
-from handling_missing import handle_missing
+from handling_outliers import handling_outliers, handling_int_rate_outliers, OUTLIERS_CAPS_PATH
+from handling_missing import handle_missing, emp_length_coefficients_path, MEANS_DICT_PATH
 from handling_inconsistency import handle_inconsistencies
-from transformation import transform_fn, transform_grade
+from transformation import transform_fn, transform_grade, ENCODINGS_DIR, SCALERS_DIR
+from aggregates import IncrementalAggregates
+from large_data import quantile_summary
+from storage import (write_parquet, read_parquet, write_arrow, partition_path, CLEANED_SCHEMA,
+                     TRANSFORMED_SCHEMA, PARTITION_FILE_NAME)
+from instrumentation import pipeline, run_stage
+from stage_cache import stage_key, is_cached, write_manifest
 
 """
 The clean module for the transformation pipeline which includes the following functions:
 - drop_extra_columns
 - load_data
-- main : A function to handle the main transformation pipeline from loading the data to handling outliers, missing values, inconsistencies, and transformations
+- clean_raw_data
+- extract_clean_key
+- extract_clean : The cleaning task of the full pipeline
+- transform_key
+- dashboard_summary_tables
+- transform : The transformation task of the full pipeline
+- land_raw_partitions : A function to split a raw file into issue month partitions
+- check_fitted_artifacts
+- extract_clean_partition : The cleaning task of the incremental pipeline, for one issue month
+- transform_partition : The transformation task of the incremental pipeline, for one issue month
 """
 
 STATES_DICT_PATH = "/opt/airflow/data/usa_state_name_code_map.json"
 EMP_LENGTH_MODEL_PATH = "/opt/airflow/models/emp_length_model.pkl"
 STREAMED_RAW_DATA_PATH = "/opt/airflow/data/streamed_raw_data.csv"
+RAW_ISSUE_DATE_COLUMN = "Issue Date"
+CHUNK_SIZE = 100_000
+# Written next to the raw partitions once every partition of a raw file is in place
+LANDED_MARKER_SUFFIX = ".landed"
+# The modules whose code the outputs of extract_clean and transform depend on
+EXTRACT_CLEAN_MODULES = ["functions", "init_cleaning", "handling_inconsistency", "handling_outliers",
+                         "handling_missing", "transformation", "artifacts", "storage"]
+TRANSFORM_MODULES = ["functions", "transformation", "encoders", "artifacts", "storage", "aggregates",
+                     "large_data"]
 
 
 def drop_extra_columns(df: pd.DataFrame) -> pd.DataFrame:
@@ -64,48 +90,228 @@ def load_data(path: str) -> pd.DataFrame:
     return pd.read_csv(path)
 
 
+def clean_raw_data(df: pd.DataFrame) -> pd.DataFrame:
+    """A function to run the cleaning stages on raw data, fitting the artifacts that do not exist yet
+    Args:
+        df: A pandas DataFrame of raw data
+    Returns:
+        A pandas DataFrame
+    """
+    print("Starting transformation pipeline")
+    df = run_stage("init_cleaning", init_cleaning, df)
+    print("Handling inconsistencies")
+    df = run_stage("handle_inconsistencies", handle_inconsistencies, df)
+    print("Handling outliers")
+    df = run_stage("handling_outliers", handling_outliers, df)
+    df = run_stage("transform_grade", transform_grade, df)
+    print("Handling missing values")
+    df = run_stage("handle_missing",
+                   handle_missing,
+                   df,
+                   model_path=EMP_LENGTH_MODEL_PATH)
+    df = run_stage("handling_int_rate_outliers",
+                   handling_int_rate_outliers, df)
+    return df
+
+
+def extract_clean_key(data_path: str) -> dict:
+    """A function to get the stage cache key of extract_clean, see stage_key
+    Args:
+        data_path: A string representing the path to the raw data
+    Returns:
+        A dictionary of the digests of the raw data, the fitted cleaning artifacts and the cleaning code
+    """
+    artifacts = [OUTLIERS_CAPS_PATH, MEANS_DICT_PATH, EMP_LENGTH_MODEL_PATH,
+                 emp_length_coefficients_path(EMP_LENGTH_MODEL_PATH)]
+    return stage_key("extract_clean", [data_path], artifacts, EXTRACT_CLEAN_MODULES)
+
+
+@pipeline("extract_clean")
 def extract_clean(data_path: str, intermediate_data_path: str) -> None:
-    if os.path.exists(intermediate_data_path):
+    if run_stage("check_cache", is_cached, intermediate_data_path, extract_clean_key(data_path)):
         print("Data already cleaned")
-        df = load_data(intermediate_data_path)
     else:
         print("Loading raw data")
-        df = load_data(data_path)
-        lookup_df = pd.DataFrame(
-            columns=["column", "original", "imputed", "impute_type"])
-        print("Starting transformation pipeline")
-        df = init_cleaning(df)
-        print("Handling inconsistencies")
-        df, lookup_df = handle_inconsistencies(df,
-                                               lookup_df,
-                                               update_lookup=True)
-        print("Handling outliers")
-        df = handling_outliers(df)
-        df, lookup_df = transform_grade(df, lookup_df, update_lookup=True)
-        print("Handling missing values")
-        df, lookup_df = handle_missing(df,
-                                       lookup_df,
-                                       EMP_LENGTH_MODEL_PATH,
-                                       update_lookup=True)
-        df = handling_int_rate_outliers(df)
+        df = run_stage("load_data", load_data, data_path)
+        df = clean_raw_data(df)
         print("Saving cleaned data")
-        df.to_csv(intermediate_data_path)
+        run_stage("write_parquet", write_parquet, df, intermediate_data_path,
+                  CLEANED_SCHEMA)
+        # The key is taken once the stage ran, with the artifacts it fitted
+        write_manifest(intermediate_data_path, extract_clean_key(data_path))
+
+
+def transform_key(intermediate_data_path: str) -> dict:
+    """A function to get the stage cache key of transform, see stage_key
+    Args:
+        intermediate_data_path: A string representing the path to the cleaned data
+    Returns:
+        A dictionary of the digests of the cleaned data, the fitted encodings and scalers and the transformation code
+    """
+    artifacts = [ENCODINGS_DIR, SCALERS_DIR, STATES_DICT_PATH]
+    return stage_key("transform", [intermediate_data_path], artifacts, TRANSFORM_MODULES)
+
+
+def dashboard_summary_tables(df: pd.DataFrame) -> dict:
+    """A function to compute the tables the dashboard reads next to the Arrow file,
+    so the dashboard workers never aggregate the loans themselves
+    Args:
+        df: A pandas DataFrame of the transformed data
+    Returns:
+        A dictionary of the summary tables, see IncrementalAggregates.tables,
+        and of grade_loan_amount_summary, see quantile_summary
+    """
+    aggregates = IncrementalAggregates()
+    aggregates.update(df)
+    summary_tables = aggregates.tables()
+    summary_tables["grade_loan_amount_summary"] = quantile_summary(
+        df, "grade", "loan_amount_sqrt_normalized").reset_index()
+    return summary_tables
 
 
-def transform(intermediate_data_path: str, transformed_data_path: str) -> None:
-    if os.path.exists(transformed_data_path):
+@pipeline("transform")
+def transform(intermediate_data_path: str, transformed_data_path: str, arrow_data_path: str = None) -> None:
+    """A function to transform the cleaned data, also publishing it as an Arrow file for the dashboard
+    with the summary tables it reads, see dashboard_summary_tables
+    The Arrow file gets its own manifest with the same key, so it is published again
+    whenever it was not written from the current transformed data
+    Args:
+        intermediate_data_path: A string representing the path to the cleaned data
+        transformed_data_path: A string representing the path to the transformed data
+        arrow_data_path: A string representing the path to the Arrow file, not published if None
+    """
+    key = transform_key(intermediate_data_path)
+    if run_stage("check_cache", is_cached, transformed_data_path, key):
         print("Data already Transformed")
-        df = load_data(transformed_data_path)
+        if arrow_data_path and not run_stage("check_arrow_cache", is_cached, arrow_data_path, key):
+            print("Publishing transformed data as Arrow")
+            df = run_stage("read_parquet", read_parquet, transformed_data_path)
+            summary_tables = run_stage("summary_tables", dashboard_summary_tables, df)
+            run_stage("write_arrow", write_arrow, df, arrow_data_path, TRANSFORMED_SCHEMA, summary_tables)
+            write_manifest(arrow_data_path, key)
     else:
-        print("Loading raw data")
-        df = load_data(intermediate_data_path)
-        lookup_df = pd.DataFrame(
-            columns=["column", "original", "imputed", "impute_type"])
+        print("Loading cleaned data")
+        df = run_stage("read_parquet", read_parquet, intermediate_data_path)
         print("Transforming data")
-        df, lookup_df = transform_fn(df,
-                                     lookup_df,
-                                     STATES_DICT_PATH,
-                                     update_lookup=True)
+        df = run_stage("transform", transform_fn, df, STATES_DICT_PATH)
         # df = drop_extra_columns(df)
         print("Saving transformed data")
-        df.to_csv(transformed_data_path)
+        run_stage("write_parquet", write_parquet, df, transformed_data_path,
+                  TRANSFORMED_SCHEMA)
+        if arrow_data_path:
+            print("Publishing transformed data as Arrow")
+            summary_tables = run_stage("summary_tables", dashboard_summary_tables, df)
+            run_stage("write_arrow", write_arrow, df, arrow_data_path, TRANSFORMED_SCHEMA, summary_tables)
+        # The key is taken once the stage ran, with the artifacts it fitted
+        key = transform_key(intermediate_data_path)
+        write_manifest(transformed_data_path, key)
+        if arrow_data_path:
+            write_manifest(arrow_data_path, key)
+
+
+@pipeline("land_raw_partitions")
+def land_raw_partitions(data_path: str, raw_partitions_dir: str, chunk_size: int = CHUNK_SIZE) -> None:
+    """A function to split a raw CSV file into one CSV file per issue month,
+    the layout new raw data is expected to land in for the incremental pipeline
+    The partitions are written to a landing directory first and each file is moved into place
+    with os.replace, so a partition never holds a partly written file. A marker is written once
+    every file is in place, a failed run leaves no marker and is landed again from scratch.
+    Args:
+        data_path: A string representing the path to the raw CSV file
+        raw_partitions_dir: A string representing the directory of the raw partitions
+        chunk_size: The number of rows read at once
+    """
+    landed_file = os.path.basename(data_path)
+    marker_path = os.path.join(raw_partitions_dir, landed_file + LANDED_MARKER_SUFFIX)
+    if os.path.exists(marker_path):
+        print("Raw data already landed")
+        return
+
+    # inside raw_partitions_dir, so os.replace stays on the same file system
+    landing_dir = os.path.join(raw_partitions_dir, f".landing_{landed_file}")
+    shutil.rmtree(landing_dir, ignore_errors=True)
+    landed_months = set()
+    for chunk in pd.read_csv(data_path, chunksize=chunk_size):
+        issue_months = pd.to_datetime(chunk[RAW_ISSUE_DATE_COLUMN]).dt.strftime("%Y-%m")
+        for issue_month, rows in chunk.groupby(issue_months):
+            month_dir = partition_path(landing_dir, issue_month)
+            os.makedirs(month_dir, exist_ok=True)
+            rows.to_csv(os.path.join(month_dir, landed_file), mode="a", index=False,
+                        header=issue_month not in landed_months)
+            landed_months.add(issue_month)
+
+    for issue_month in sorted(landed_months):
+        month_dir = partition_path(raw_partitions_dir, issue_month)
+        os.makedirs(month_dir, exist_ok=True)
+        os.replace(os.path.join(partition_path(landing_dir, issue_month), landed_file),
+                   os.path.join(month_dir, landed_file))
+    shutil.rmtree(landing_dir)
+    with open(marker_path, "w") as file:
+        file.write("\n".join(sorted(landed_months)))
+    print(f"Raw data landed in {len(landed_months)} issue month partitions")
+
+
+def check_fitted_artifacts() -> None:
+    """A function to make sure the artifacts fitted by the full pipeline exist,
+    so a partition is never cleaned with artifacts fitted on that partition alone
+    Raises:
+        ValueError: If an artifact is missing
+    """
+    # the exported coefficients are only used while the pickled model they come from exists
+    artifacts = [OUTLIERS_CAPS_PATH, MEANS_DICT_PATH, ENCODINGS_DIR, SCALERS_DIR, EMP_LENGTH_MODEL_PATH]
+    missing = [path for path in artifacts if not os.path.exists(path)]
+    if missing:
+        raise ValueError(
+            f"Missing fitted artifacts {missing}, run the full fintech_pipeline first")
+
+
+@pipeline("extract_clean_partition")
+def extract_clean_partition(raw_partitions_dir: str, cleaned_partitions_dir: str, issue_month: str) -> None:
+    """A function to clean the raw files landed for one issue month with the fitted artifacts,
+    a month without raw files has its cleaned partition removed so no stale data is loaded
+    Args:
+        raw_partitions_dir: A string representing the directory of the raw partitions
+        cleaned_partitions_dir: A string representing the directory of the cleaned partitions
+        issue_month: A string representing the month, like 2016-01
+    """
+    check_fitted_artifacts()
+    raw_files = sorted(glob.glob(os.path.join(partition_path(raw_partitions_dir, issue_month), "*.csv")))
+    cleaned_dir = partition_path(cleaned_partitions_dir, issue_month)
+    if not raw_files:
+        print(f"No raw data landed for {issue_month}")
+        shutil.rmtree(cleaned_dir, ignore_errors=True)
+        return
+
+    print(f"Loading raw data of {issue_month}")
+    df = pd.concat([run_stage("load_data", load_data, path) for path in raw_files], ignore_index=True)
+    df = clean_raw_data(df)
+    print("Saving cleaned data")
+    os.makedirs(cleaned_dir, exist_ok=True)
+    run_stage("write_parquet", write_parquet, df, os.path.join(cleaned_dir, PARTITION_FILE_NAME),
+              CLEANED_SCHEMA)
+
+
+@pipeline("transform_partition")
+def transform_partition(cleaned_partitions_dir: str, transformed_partitions_dir: str, issue_month: str) -> None:
+    """A function to transform the cleaned data of one issue month with the fitted artifacts,
+    a month without cleaned data has its transformed partition removed so no stale data is loaded
+    Args:
+        cleaned_partitions_dir: A string representing the directory of the cleaned partitions
+        transformed_partitions_dir: A string representing the directory of the transformed partitions
+        issue_month: A string representing the month, like 2016-01
+    """
+    cleaned_path = os.path.join(partition_path(cleaned_partitions_dir, issue_month), PARTITION_FILE_NAME)
+    transformed_dir = partition_path(transformed_partitions_dir, issue_month)
+    if not os.path.exists(cleaned_path):
+        print(f"No cleaned data for {issue_month}")
+        shutil.rmtree(transformed_dir, ignore_errors=True)
+        return
+
+    print(f"Loading cleaned data of {issue_month}")
+    df = run_stage("read_parquet", read_parquet, cleaned_path)
+    print("Transforming data")
+    df = run_stage("transform", transform_fn, df, STATES_DICT_PATH)
+    print("Saving transformed data")
+    os.makedirs(transformed_dir, exist_ok=True)
+    run_stage("write_parquet", write_parquet, df, os.path.join(transformed_dir, PARTITION_FILE_NAME),
+              TRANSFORMED_SCHEMA)
@@ -1,92 +1,117 @@
 import pandas as pd
 import numpy as np
+from lookup_table import LookupTable
 
 """
 A module for handling inconsistency in data which includes the following functions:
+- map_unique : A function to apply a normalization to the distinct values of a column only
+- normalize_emp_length
+- normalize_term
+- normalize_type
 - handle_emp_length
 - handle_term
 - handle_type
 """
 
 
-def handle_emp_length(df: pd.DataFrame, lookup_df: pd.DataFrame) -> pd.DataFrame:
+def map_unique(series: pd.Series, normalize) -> pd.Series:
+    """A function to apply a normalization to the distinct values of a column only
+    and broadcast the results back to the rows, every kind of missing value (None, NaN) is normalized once
+    Args:
+        series: A pandas Series
+        normalize: A function taking and returning a pandas Series of the same length
+    Returns:
+        A pandas Series with the index of series
+    """
+    codes, uniques = pd.factorize(series)
+    distinct = pd.Series(uniques, dtype=object)
+    missing = codes == -1
+    if missing.any():
+        # factorize merges None and NaN, they are told apart by their string forms
+        missing_values = series[missing]
+        missing_codes, _ = pd.factorize(missing_values.astype(str))
+        _, first_rows = np.unique(missing_codes, return_index=True)
+        codes[missing] = len(uniques) + missing_codes
+        missing_values = missing_values.iloc[first_rows].reset_index(drop=True)
+        distinct = (
+            pd.concat([distinct, missing_values.astype(object)], ignore_index=True)
+            if len(distinct)
+            else missing_values
+        )
+    return pd.Series(normalize(distinct).to_numpy()[codes], index=series.index)
+
+
+def normalize_emp_length(values: pd.Series) -> pd.Series:
+    """A function to convert emp_length values like "< 1 year" or "10+ years" to numbers
+    Args:
+        values: A pandas Series
+    Returns:
+        A pandas Series of floats
+    """
+#    convert nan to -1
+    values = values.fillna("-1")
+    values = values.str.replace("years", "").str.strip()
+    values = values.str.replace("year", "").str.strip()
+    values = values.str.replace("< 1", "0.5").str.strip()
+    values = values.str.replace("10+", "11").str.strip()
+    values = values.astype("float")
+    return values.replace(-1, np.nan)
+
+
+def normalize_term(values: pd.Series) -> pd.Series:
+    """A function to convert term values like "36 months" to numbers
+    Args:
+        values: A pandas Series
+    Returns:
+        A pandas Series of integers
+    """
+    return values.str.replace("months", "").str.strip().astype("int")
+
+
+def normalize_type(values: pd.Series) -> pd.Series:
+    """A function to convert type values to lower case snake case, merging joint_app into joint
+    Args:
+        values: A pandas Series
+    Returns:
+        A pandas Series
+    """
+    values = values.str.lower()
+    values = values.str.replace(" ", "_")
+    return values.str.replace("joint_app", "joint")
+
+
+def handle_emp_length(df: pd.DataFrame, lookup: LookupTable = None) -> pd.DataFrame:
     """A function to handle the emp_length column and update the lookup table
     Args:
         df: A pandas DataFrame
-        lookup_df: A pandas DataFrame
+        lookup: The lookup table to add the entries to, skipped if None
     Returns:
-         A tuple of 2 pandas DataFrames
+        A pandas DataFrame
     """
 
-#    convert nan to -1
-    df["emp_length"] = df["emp_length"].fillna("-1")
-    df["emp_length"] = df["emp_length"].str.replace("years", "").str.strip()
-    df["emp_length"] = df["emp_length"].str.replace("year", "").str.strip()
-    df["emp_length"] = df["emp_length"].str.replace("< 1", "0.5").str.strip()
-    df["emp_length"] = df["emp_length"].str.replace("10+", "11").str.strip()
-    df["emp_length"] = df["emp_length"].astype("float")
-    df["emp_length"] = df["emp_length"].replace(-1, np.nan)
-    new_row1 = pd.DataFrame(
-        [
-            {
-                "column": "emp_length",
-                "original": "< 1 years",
-                "imputed": "0.5",
-                "impute_type": "custom",
-            }
-        ]
-    )
-    new_row2 = pd.DataFrame(
-        [
-            {
-                "column": "emp_length",
-                "original": "10+ years",
-                "imputed": "11",
-                "impute_type": "custom",
-            }
-        ]
-    )
-
-    lookup_df = pd.concat([lookup_df, new_row1], ignore_index=True)
-    lookup_df = pd.concat([lookup_df, new_row2], ignore_index=True)
-
-    return df, lookup_df
-
-
-def handle_term(df: pd.DataFrame, lookup_df: pd.DataFrame) -> pd.DataFrame:
+    df["emp_length"] = map_unique(df["emp_length"], normalize_emp_length)
+
+    if lookup is not None:
+        lookup.add("emp_length", "< 1 years", "0.5", "custom")
+        lookup.add("emp_length", "10+ years", "11", "custom")
+
+    return df
+
+
+def handle_term(df: pd.DataFrame, lookup: LookupTable = None) -> pd.DataFrame:
     """A function to handle the term column and update the lookup table
     Args:
         df: A pandas DataFrame
-        lookup_df: A pandas DataFrame
+        lookup: The lookup table to add the entries to, skipped if None
     Returns:
-         A tuple of 2 pandas DataFrames
+        A pandas DataFrame
     """
-    df["term"] = df["term"].str.replace("months", "").str.strip()
-    df["term"] = df["term"].astype("int")
-    new_row1 = pd.DataFrame(
-        [
-            {
-                "column": "term",
-                "original": "36 months",
-                "imputed": "36",
-                "impute_type": "custom",
-            }
-        ]
-    )
-    new_row2 = pd.DataFrame(
-        [
-            {
-                "column": "term",
-                "original": "60 months",
-                "imputed": "60",
-                "impute_type": "custom",
-            }
-        ]
-    )
-
-    lookup_df = pd.concat([lookup_df, new_row1], ignore_index=True)
-    lookup_df = pd.concat([lookup_df, new_row2], ignore_index=True)
-    return df, lookup_df
+    df["term"] = map_unique(df["term"], normalize_term)
+
+    if lookup is not None:
+        lookup.add("term", "36 months", "36", "custom")
+        lookup.add("term", "60 months", "60", "custom")
+    return df
 
 
 def handle_type(df: pd.DataFrame) -> pd.DataFrame:
@@ -96,27 +121,21 @@ def handle_type(df: pd.DataFrame) -> pd.DataFrame:
     Returns:
         A pandas DataFrame
     """
-    df["type"] = df["type"].str.lower()
-    df["type"] = df["type"].str.replace(" ", "_")
-    df["type"] = df["type"].str.replace("joint_app", "joint")
+    df["type"] = map_unique(df["type"], normalize_type)
     return df
 
 
 def handle_inconsistencies(
-    df: pd.DataFrame, lookup_df: pd.DataFrame, update_lookup: bool = False
+    df: pd.DataFrame, lookup: LookupTable = None
 ) -> pd.DataFrame:
     """A function to handle inconsistencies in the DataFrame
     Args:
         df: A pandas DataFrame
-        lookup_df: A pandas DataFrame
+        lookup: The lookup table to add the entries to, skipped if None
     Returns:
         A pandas DataFrame
     """
-    df, lookup_df = handle_emp_length(df, lookup_df)
-    df, lookup_df = handle_term(df, lookup_df)
+    df = handle_emp_length(df, lookup)
+    df = handle_term(df, lookup)
     df = handle_type(df)
-
-    if not update_lookup:
-        return df
-
-    return df, lookup_df
+    return df
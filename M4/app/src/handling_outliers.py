@@ -1,6 +1,6 @@
 import pandas as pd
 import numpy as np
-import json
+from artifacts import registry
 
 OUTLIERS_CAPS_PATH = "/opt/airflow/data/outliers_caps.json"
 
@@ -25,8 +25,7 @@ def cap_outliers_IQR(df: pd.DataFrame, column: str) -> pd.DataFrame:
         A pandas DataFrame
     """
     try:
-        with open(OUTLIERS_CAPS_PATH, "r") as f:
-            outliers_caps = json.load(f)
+        outliers_caps = registry.load_json(OUTLIERS_CAPS_PATH)
     except FileNotFoundError:
         outliers_caps = {}
 
@@ -37,10 +36,9 @@ def cap_outliers_IQR(df: pd.DataFrame, column: str) -> pd.DataFrame:
         lower_bound = Q1 - 1.5 * IQR
         upper_bound = Q3 + 1.5 * IQR
 
-        outliers_caps[column] = {"lower_bound": lower_bound, "upper_bound": upper_bound}
+        outliers_caps[column] = {"lower_bound": float(lower_bound), "upper_bound": float(upper_bound)}
 
-        with open(OUTLIERS_CAPS_PATH, "w") as f:
-            json.dump(outliers_caps, f, indent=4)
+        registry.save_json(OUTLIERS_CAPS_PATH, outliers_caps, indent=4)
     else:
         lower_bound = outliers_caps[column]["lower_bound"]
         upper_bound = outliers_caps[column]["upper_bound"]
@@ -61,8 +59,7 @@ def cap_outliers_IQR_int_rate(
         A pandas DataFrame
     """
     try:
-        with open(OUTLIERS_CAPS_PATH, "r") as f:
-            outliers_caps = json.load(f)
+        outliers_caps = registry.load_json(OUTLIERS_CAPS_PATH)
     except FileNotFoundError:
         outliers_caps = {}
 
@@ -75,11 +72,10 @@ def cap_outliers_IQR_int_rate(
 
         outliers_caps[column] = {
             **outliers_caps.get(column, {}),
-            grade: {"lower_bound": lower_bound, "upper_bound": upper_bound},
+            grade: {"lower_bound": float(lower_bound), "upper_bound": float(upper_bound)},
         }
 
-        with open(OUTLIERS_CAPS_PATH, "w") as f:
-            json.dump(outliers_caps, f, indent=4)
+        registry.save_json(OUTLIERS_CAPS_PATH, outliers_caps, indent=4)
     else:
         lower_bound = outliers_caps[column][grade]["lower_bound"]
         upper_bound = outliers_caps[column][grade]["upper_bound"]
@@ -145,7 +141,7 @@ def handling_int_rate_outliers(df: pd.DataFrame) -> pd.DataFrame:
         A pandas DataFrame
     """
     df["int_rate_outliers_capped"] = (
-        df.groupby("grade")
+        df.groupby("grade", observed=True)
         .apply(lambda x: cap_outliers_IQR_int_rate(x, "int_rate", x.name))
         .reset_index(0, drop=True)["int_rate"]
     )
@@ -0,0 +1,69 @@
+import numpy as np
+import pandas as pd
+
+"""
+A module for keeping the dashboard plots light on large datasets which includes the following:
+- stratum_quotas : A function to split a point budget between groups in proportion to their sizes
+- stratified_sample : A function to downsample a DataFrame to a point budget keeping the share of every group
+- quantile_summary : A function to summarize a column per group with the statistics of a box plot
+"""
+
+
+def stratum_quotas(counts: pd.Series, budget: int) -> pd.Series:
+    """A function to split a point budget between groups in proportion to their sizes,
+    every group gets at least one point and at most all of its rows
+    Args:
+        counts: A pandas Series of the number of rows of each group
+        budget: The number of rows to keep
+    Returns:
+        A pandas Series of the number of rows to keep of each group
+    """
+    quotas = np.maximum(1, np.round(counts * budget / counts.sum()))
+    return quotas.astype(int).clip(upper=counts)
+
+
+def stratified_sample(df: pd.DataFrame, column: str, budget: int, seed: int = 0) -> pd.DataFrame:
+    """A function to downsample a DataFrame to about budget rows, stratified by a column
+    Every group keeps its share of the rows and at least one row, so small groups still show up.
+    The sample is deterministic for the same data, budget and seed.
+    Args:
+        df: A pandas DataFrame
+        column: The column to stratify by
+        budget: The number of rows to keep
+        seed: The seed of the sample
+    Returns:
+        A pandas DataFrame with at most budget rows (plus one row per group for the rounding), in the original order
+    """
+    if len(df) <= budget:
+        return df
+
+    quotas = stratum_quotas(df[column].value_counts(), budget)
+    samples = [
+        group.sample(n=quotas[value], random_state=seed)
+        for value, group in df.groupby(column, observed=True)
+    ]
+    return pd.concat(samples).sort_index()
+
+
+def quantile_summary(df: pd.DataFrame, by: str, column: str) -> pd.DataFrame:
+    """A function to summarize a column per group with the statistics of a box plot,
+    the whiskers reach the furthest values within 1.5 IQR of the quartiles
+    Args:
+        df: A pandas DataFrame
+        by: The column to group by
+        column: The column to summarize
+    Returns:
+        A pandas DataFrame indexed by the groups with the columns
+        q1, median, q3, mean, lowerfence and upperfence
+    """
+    grouped = df.groupby(by, observed=True)[column]
+    summary = grouped.quantile([0.25, 0.5, 0.75]).unstack()
+    summary.columns = ["q1", "median", "q3"]
+    summary["mean"] = grouped.mean()
+
+    iqr = summary["q3"] - summary["q1"]
+    lower = df[by].map(summary["q1"] - 1.5 * iqr).astype(float)
+    upper = df[by].map(summary["q3"] + 1.5 * iqr).astype(float)
+    summary["lowerfence"] = df[column].where(df[column] >= lower).groupby(df[by], observed=True).min()
+    summary["upperfence"] = df[column].where(df[column] <= upper).groupby(df[by], observed=True).max()
+    return summary
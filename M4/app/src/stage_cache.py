@@ -0,0 +1,114 @@
+import hashlib
+import importlib
+import json
+import os
+from typing import List
+
+"""
+A module for skipping pipeline stages whose inputs did not change which includes the following:
+- MANIFEST_SUFFIX : The suffix of the manifest saved next to a stage output
+- file_digest : A function to hash the content of a file or a directory
+- code_digest : A function to hash the source code of modules
+- stage_key : A function to describe everything a stage output depends on
+- is_cached : A function to check if a stage output is up to date with its key
+- write_manifest : A function to save the key of a stage output next to it
+"""
+
+MANIFEST_SUFFIX = ".manifest.json"
+# Bytes read at once when hashing a file
+HASH_CHUNK_SIZE = 1 << 20
+
+
+def file_digest(path: str) -> str:
+    """A function to hash the content of a file, or of every file in a directory
+    Args:
+        path: A string representing the path to the file or directory
+    Returns:
+        The sha256 hex digest of the content, "missing" if the path does not exist
+    """
+    if not os.path.exists(path):
+        return "missing"
+
+    digest = hashlib.sha256()
+    if os.path.isdir(path):
+        for root, dirs, files in os.walk(path):
+            dirs.sort()
+            for name in sorted(files):
+                file_path = os.path.join(root, name)
+                digest.update(os.path.relpath(file_path, path).encode())
+                digest.update(file_digest(file_path).encode())
+        return digest.hexdigest()
+
+    with open(path, "rb") as file:
+        for chunk in iter(lambda: file.read(HASH_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def code_digest(modules: List[str]) -> str:
+    """A function to hash the source code of modules, so editing a stage invalidates its outputs
+    Args:
+        modules: The names of the modules the stage runs
+    Returns:
+        The sha256 hex digest of the sources
+    """
+    digest = hashlib.sha256()
+    for name in modules:
+        digest.update(name.encode())
+        digest.update(file_digest(importlib.import_module(name).__file__).encode())
+    return digest.hexdigest()
+
+
+def stage_key(stage: str, inputs: List[str], artifacts: List[str], modules: List[str]) -> dict:
+    """A function to describe everything a stage output depends on
+    Args:
+        stage: The name of the stage
+        inputs: The paths of the data files the stage reads
+        artifacts: The paths of the fitted artifacts the stage reads or fits
+        modules: The names of the modules the stage runs
+    Returns:
+        A dictionary of the stage name, the digests of the inputs and artifacts and the code digest
+    """
+    return {
+        "stage": stage,
+        "inputs": {path: file_digest(path) for path in inputs},
+        "artifacts": {path: file_digest(path) for path in artifacts},
+        "code": code_digest(modules),
+    }
+
+
+def is_cached(output_path: str, key: dict) -> bool:
+    """A function to check if a stage output was produced from the same inputs, artifacts and code
+    Args:
+        output_path: A string representing the path to the stage output
+        key: The key of the stage, see stage_key
+    Returns:
+        True if the output and its manifest exist, the manifest key matches and the output is unchanged
+    """
+    try:
+        with open(output_path + MANIFEST_SUFFIX) as file:
+            manifest = json.load(file)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return False
+
+    changed = [
+        part for part in ("stage", "inputs", "artifacts", "code")
+        if manifest["key"].get(part) != key[part]
+    ]
+    if manifest["output"] != file_digest(output_path):
+        changed.append("output")
+    if changed:
+        print(f"Cached {output_path} is stale, changed: {', '.join(changed)}")
+        return False
+    return True
+
+
+def write_manifest(output_path: str, key: dict) -> None:
+    """A function to save the key of a stage output next to it, once the output is written
+    Args:
+        output_path: A string representing the path to the stage output
+        key: The key of the stage, see stage_key
+    """
+    manifest = {"key": key, "output": file_digest(output_path)}
+    with open(output_path + MANIFEST_SUFFIX, "w") as file:
+        json.dump(manifest, file, indent=4)
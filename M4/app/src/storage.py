@@ -0,0 +1,182 @@
+import json
+import os
+import pandas as pd
+import pyarrow as pa
+from io import StringIO
+from typing import Dict, List
+
+"""
+A module for exchanging typed intermediate files between the DAG tasks which includes the following:
+- CLEANED_SCHEMA : The column types of the output of extract_clean
+- TRANSFORMED_SCHEMA : The column types of the output of transform
+- apply_schema
+- write_parquet
+- read_parquet
+- write_arrow : A function to publish a DataFrame as an uncompressed Arrow IPC file
+- read_arrow : A function to open an Arrow IPC file memory-mapped
+- read_summary_tables : A function to read the summary tables published with an Arrow file
+- partition_path : A function to get the directory of an issue month partition
+"""
+
+PARQUET_COMPRESSION = "snappy"
+# The incremental pipeline partitions the data by the month of issue_date, like issue_month=2016-01
+PARTITION_COLUMN = "issue_month"
+PARTITION_FILE_NAME = "part.parquet"
+# The schema metadata key the summary tables are published under in the Arrow file
+SUMMARY_TABLES_METADATA_KEY = b"summary_tables"
+
+CLEANED_SCHEMA = {
+    "customer_id": "object",
+    "emp_title": "object",
+    "emp_length": "float64",
+    "home_ownership": "object",
+    "annual_inc": "float64",
+    "annual_inc_joint": "float64",
+    "verification_status": "object",
+    "zip_code": "object",
+    "addr_state": "object",
+    "avg_cur_bal": "float64",
+    "tot_cur_bal": "float64",
+    "loan_status": "object",
+    "loan_amount": "float64",
+    "state": "object",
+    "funded_amount": "float64",
+    "term": "int64",
+    "int_rate": "float64",
+    "grade": "object",
+    "issue_date": "datetime64[ns]",
+    "type": "object",
+    "purpose": "object",
+    "description": "object",
+    "annual_inc_log": "float64",
+    "annual_inc_joint_log": "float64",
+    "avg_cur_bal_log": "float64",
+    "tot_cur_bal_log": "float64",
+    "loan_amount_sqrt": "float64",
+    "funded_amount_sqrt": "float64",
+    "emp_length_imputed": "float64",
+    "int_rate_outliers_capped": "float64",
+}
+
+# The one-hot and label encoded columns depend on the fitted encodings and keep their own types
+TRANSFORMED_SCHEMA = {
+    **CLEANED_SCHEMA,
+    "month_number": "int64",
+    "salary_can_cover": "int64",
+    "installment_per_month": "float64",
+    "state_name": "object",
+    "int_rate_normalized": "float64",
+    "loan_amount_sqrt_normalized": "float64",
+    "funded_amount_sqrt_normalized": "float64",
+    "installment_per_month_normalized": "float64",
+}
+
+
+def apply_schema(df: pd.DataFrame, schema: Dict[str, str]) -> pd.DataFrame:
+    """A function to cast the columns of a DataFrame to the types of a schema
+    Args:
+        df: A pandas DataFrame
+        schema: A dictionary of column names to pandas dtypes
+    Returns:
+        A pandas DataFrame
+    """
+    dtypes = {
+        column: dtype
+        for column, dtype in schema.items()
+        if column in df.columns and str(df[column].dtype) != dtype
+    }
+    if "issue_date" in dtypes:
+        df["issue_date"] = pd.to_datetime(df["issue_date"])
+        del dtypes["issue_date"]
+    return df.astype(dtypes) if dtypes else df
+
+
+def write_parquet(df: pd.DataFrame, path: str, schema: Dict[str, str]) -> None:
+    """A function to save a DataFrame and its index as a compressed Parquet file
+    Args:
+        df: A pandas DataFrame
+        path: A string representing the path to the file
+        schema: A dictionary of column names to pandas dtypes
+    """
+    df = apply_schema(df, schema)
+    df.to_parquet(path, engine="pyarrow", compression=PARQUET_COMPRESSION, index=True)
+
+
+def read_parquet(path: str, columns: List[str] = None) -> pd.DataFrame:
+    """A function to load a DataFrame from a Parquet file
+    Args:
+        path: A string representing the path to the file
+        columns: The columns to read, all of them if None
+    Returns:
+        A pandas DataFrame
+    """
+    return pd.read_parquet(path, engine="pyarrow", columns=columns)
+
+
+def write_arrow(
+    df: pd.DataFrame, path: str, schema: Dict[str, str], summary_tables: Dict[str, pd.DataFrame] = None
+) -> None:
+    """A function to publish a DataFrame and its index as an uncompressed Arrow IPC file
+    The file is written next to path and renamed over it, so readers never see a partial file
+    and readers that already mapped the previous file keep reading it.
+    Args:
+        df: A pandas DataFrame
+        path: A string representing the path to the file
+        schema: A dictionary of column names to pandas dtypes
+        summary_tables: A dictionary of small pandas DataFrames saved as JSON in the schema metadata,
+            so readers get them without reading the rows, None to skip them
+    """
+    table = pa.Table.from_pandas(apply_schema(df, schema), preserve_index=True)
+    if summary_tables is not None:
+        encoded = json.dumps({
+            name: summary.to_json(orient="table", index=False, double_precision=15)
+            for name, summary in summary_tables.items()
+        })
+        table = table.replace_schema_metadata(
+            {**table.schema.metadata, SUMMARY_TABLES_METADATA_KEY: encoded.encode()})
+    temporary_path = f"{path}.tmp"
+    # Uncompressed, so the mapped pages are the columns themselves
+    with pa.OSFile(temporary_path, "wb") as sink:
+        with pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+    os.replace(temporary_path, path)
+
+
+def read_arrow(path: str) -> pa.Table:
+    """A function to open an Arrow IPC file memory-mapped, without copying or parsing its columns
+    Processes opening the same file share one copy of it in the page cache.
+    Args:
+        path: A string representing the path to the file
+    Returns:
+        A pyarrow Table backed by the mapped file
+    """
+    return pa.ipc.open_file(pa.memory_map(path, "r")).read_all()
+
+
+def read_summary_tables(table: pa.Table) -> Dict[str, pd.DataFrame]:
+    """A function to read the summary tables published with an Arrow file, see write_arrow
+    Args:
+        table: A pyarrow Table returned by read_arrow
+    Returns:
+        A dictionary of the summary table names to pandas DataFrames
+    Raises:
+        ValueError: If the file was published without summary tables
+    """
+    metadata = table.schema.metadata or {}
+    if SUMMARY_TABLES_METADATA_KEY not in metadata:
+        raise ValueError("The Arrow file has no summary tables, publish it again with transform")
+    return {
+        name: pd.read_json(StringIO(encoded), orient="table")
+        for name, encoded in json.loads(metadata[SUMMARY_TABLES_METADATA_KEY]).items()
+    }
+
+
+def partition_path(partitions_dir: str, issue_month: str) -> str:
+    """A function to get the directory of an issue month partition
+    Args:
+        partitions_dir: A string representing the directory of the partitions
+        issue_month: A string representing the month, like 2016-01
+    Returns:
+        A string representing the directory of the partition
+    """
+    return os.path.join(partitions_dir, f"{PARTITION_COLUMN}={issue_month}")